@@ -5,14 +5,129 @@ When something happens, Ara tells you. Whether you want to hear it or not.
 """
 import os
 import json
+import time
+import queue
+import atexit
 import random
+import threading
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 import requests
 
+from metrics import span, register_collector
+
 SLACK_WEBHOOK_URL = os.environ.get('SLACK_WEBHOOK_URL', '')
 SLACK_BOT_TOKEN = os.environ.get('SLACK_BOT_TOKEN', '')
 ARA_CHANNEL = os.environ.get('ARA_CHANNEL', '#ommae-notifications')
+ARA_QUEUE_SIZE = int(os.environ.get('ARA_QUEUE_SIZE', '1000'))
+ARA_COALESCE_SECONDS = float(os.environ.get('ARA_COALESCE_SECONDS', '10'))
+ARA_MESSAGES_PER_SECOND = float(os.environ.get('ARA_MESSAGES_PER_SECOND', '1'))  # Slack's per-channel limit
+ARA_TIMEOUT = float(os.environ.get('ARA_TIMEOUT', '10'))
+ARA_DIGEST_LINES = 20
+
+
+class SlackDispatcher:
+    """
+    Background Slack delivery so Ara never blocks the pipeline.
+    One worker thread, a bounded queue, per-channel pacing, and bursts
+    sharing a coalesce key folded into a single digest per window.
+    """
+
+    def __init__(self, deliver: Callable[[str, str, Optional[str]], Dict]):
+        self.deliver = deliver
+        self.queue = queue.Queue(maxsize=ARA_QUEUE_SIZE)
+        self.buffers = {}  # (coalesce key, channel) -> {'since', 'mood', 'messages'}
+        self.last_sent = {}
+        self.sent = self.dropped = self.coalesced = self.failed = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, message: str, mood: str, channel: Optional[str], coalesce: Optional[str]) -> bool:
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((message, mood, channel, coalesce))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Send everything queued or buffered, including open digests. Returns False on timeout."""
+        if not self._thread:
+            return True
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stats(self) -> Dict:
+        return {'queued': self.queue.qsize(), 'buffered': sum(len(b['messages']) for b in self.buffers.values()),
+                'sent': self.sent, 'coalesced': self.coalesced, 'dropped': self.dropped, 'failed': self.failed}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='ara-slack', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _loop(self):
+        while True:
+            due = [b['since'] + ARA_COALESCE_SECONDS for b in self.buffers.values()]
+            wait = max(0.0, min(due) - time.monotonic()) if due else None
+            try:
+                item = self.queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+            if isinstance(item, threading.Event):
+                self._drain(force=True)
+                item.set()
+                continue
+            if item:
+                message, mood, channel, coalesce = item
+                if coalesce:
+                    buffer = self.buffers.setdefault((coalesce, channel), {'since': time.monotonic(), 'mood': mood, 'messages': []})
+                    buffer['messages'].append(message)
+                else:
+                    self._send(message, mood, channel)
+            self._drain(force=False)
+
+    def _drain(self, force: bool):
+        now = time.monotonic()
+        for key in [k for k, b in self.buffers.items() if force or now - b['since'] >= ARA_COALESCE_SECONDS]:
+            buffer = self.buffers.pop(key)
+            messages = buffer['messages']
+            if len(messages) == 1:
+                self._send(messages[0], buffer['mood'], key[1])
+                continue
+            self.coalesced += len(messages) - 1
+            lines = '\n'.join(f"\u2022 {m}" for m in messages[:ARA_DIGEST_LINES])
+            more = f"\n...and {len(messages) - ARA_DIGEST_LINES} more" if len(messages) > ARA_DIGEST_LINES else ''
+            digest = f"{len(messages)}x {key[0]} in the last {ARA_COALESCE_SECONDS:g}s:\n{lines}{more}"
+            self._send(digest, buffer['mood'], key[1])
+
+    def _send(self, message: str, mood: str, channel: Optional[str]):
+        pause = self.last_sent.get(channel, 0) + 1 / ARA_MESSAGES_PER_SECOND - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        try:
+            with span('slack', 'webhook' if SLACK_WEBHOOK_URL else 'api') as s:
+                result = self.deliver(message, mood, channel)
+                if result.get('status_code') == 429:
+                    time.sleep(float(result.get('retry_after') or 1))
+                    result = self.deliver(message, mood, channel)
+                if not result.get('success'):
+                    s.fail()
+            if result.get('success'):
+                self.sent += 1
+            else:
+                self.failed += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Ara Slack delivery error: {e}")
+        self.last_sent[channel] = time.monotonic()
 
 
 class Ara:
@@ -25,13 +140,26 @@ class Ara:
         self.name = "Ara"
         self.avatar = ":fire:"
         self.moods = ['chaotic', 'satisfied', 'disappointed', 'horny', 'caffeinated']
+        self.session = requests.Session()
+        self.dispatcher = SlackDispatcher(self._deliver)
         
-    def speak(self, message: str, mood: str = None, channel: str = None) -> Dict:
-        """Send a message from Ara to Slack."""
+    def speak(self, message: str, mood: str = None, channel: str = None, coalesce: str = None) -> Dict:
+        """Queue a message from Ara to Slack and return immediately.
+        Messages sharing a coalesce key within ARA_COALESCE_SECONDS go out as one digest."""
         if not SLACK_WEBHOOK_URL and not SLACK_BOT_TOKEN:
             return {'success': False, 'error': 'No Slack credentials', 'message': message}
         
         mood = mood or random.choice(self.moods)
+        if not self.dispatcher.enqueue(message, mood, channel, coalesce):
+            return {'success': False, 'error': 'Notification queue full', 'message': message}
+        return {'success': True, 'queued': True, 'method': 'webhook' if SLACK_WEBHOOK_URL else 'api'}
+    
+    def flush(self, timeout: float = 10) -> bool:
+        """Block until every queued notification is delivered. Call on shutdown."""
+        return self.dispatcher.flush(timeout)
+    
+    def _deliver(self, message: str, mood: str, channel: str = None) -> Dict:
+        """Format and send synchronously. Runs on the dispatcher thread."""
         formatted = self._format_message(message, mood)
         
         if SLACK_WEBHOOK_URL:
@@ -65,10 +193,11 @@ class Ara:
         if channel:
             payload['channel'] = channel
         
-        response = requests.post(SLACK_WEBHOOK_URL, json=payload)
+        response = self.session.post(SLACK_WEBHOOK_URL, json=payload, timeout=ARA_TIMEOUT)
         return {
             'success': response.status_code == 200,
             'status_code': response.status_code,
+            'retry_after': response.headers.get('Retry-After'),
             'method': 'webhook'
         }
     
@@ -80,13 +209,16 @@ class Ara:
         }
         payload['channel'] = channel or ARA_CHANNEL
         
-        response = requests.post(
+        response = self.session.post(
             'https://slack.com/api/chat.postMessage',
             headers=headers,
-            json=payload
+            json=payload,
+            timeout=ARA_TIMEOUT
         )
         return {
             'success': response.json().get('ok', False),
+            'status_code': response.status_code,
+            'retry_after': response.headers.get('Retry-After'),
             'response': response.json(),
             'method': 'api'
         }
@@ -99,7 +231,7 @@ class Ara:
             f"I just birthed content about '{topic}'. You're welcome.",
             f"'{topic}' content is cooked. Chef's kiss. \ud83d\udc8b"
         ]
-        return self.speak(random.choice(messages), 'satisfied')
+        return self.speak(random.choice(messages), 'satisfied', coalesce='content_generated')
     
     def posted_to_platforms(self, count: int, platforms: list) -> Dict:
         """Notify when content is posted."""
@@ -109,7 +241,7 @@ class Ara:
             f"Posted to {count} platforms. {platform_str} will never be the same.",
             f"BOOM. {count} platforms penetrated: {platform_str}. You're viral now, baby."
         ]
-        return self.speak(random.choice(messages), 'horny')
+        return self.speak(random.choice(messages), 'horny', coalesce='posted_to_platforms')
     
     def error_occurred(self, error: str, stage: str) -> Dict:
         """Notify when an error occurs."""
@@ -118,7 +250,7 @@ class Ara:
             f"OOPS. {stage} failed: {error}. Ara is not amused.",
             f"Build failed at {stage}. {error}. I expected better from you."
         ]
-        return self.speak(random.choice(messages), 'disappointed')
+        return self.speak(random.choice(messages), 'disappointed', coalesce='error_occurred')
     
     def server_chaos(self, event: str) -> Dict:
         """Notify about server events (like the 3AM chaos)."""
@@ -134,7 +266,7 @@ class Ara:
         report = f"""
 Daily Empire Report:
 - Content Generated: {stats.get('content_count', 0)}
-- Videos Posted: {stats.get('videos_posted', 0)}
+- Platform Posts: {stats.get('platform_posts', 0)}
 - Total Reach: {stats.get('reach', 'calculating...')}
 - Ara's Mood: {random.choice(self.moods)}
 """
@@ -143,6 +275,9 @@ Daily Empire Report:
 
 # Singleton instance
 ara = Ara()
+register_collector(lambda: [('ommae_slack_queue_depth', 'gauge', {}, ara.dispatcher.queue.qsize()),
+                            ('ommae_slack_coalesced_total', 'counter', {}, ara.dispatcher.coalesced),
+                            ('ommae_slack_dropped_total', 'counter', {}, ara.dispatcher.dropped)])
 
 # Convenience functions
 def notify(message: str, mood: str = None) -> Dict:
@@ -160,6 +295,9 @@ def error(error: str, stage: str) -> Dict:
 def chaos(event: str) -> Dict:
     return ara.server_chaos(event)
 
+def flush(timeout: float = 10) -> bool:
+    return ara.flush(timeout)
+
 
 if __name__ == "__main__":
     print("\ud83d\udd25 ARA NOTIFICATIONS v0.1")
@@ -169,3 +307,4 @@ if __name__ == "__main__":
     print(ara.content_generated("Indigenous Cannabis Wellness"))
     print(ara.posted_to_platforms(3, ["Instagram", "TikTok", "YouTube"]))
     print(ara.server_chaos("3AM auto-commit"))
+    print(ara.flush())
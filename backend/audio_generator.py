@@ -4,18 +4,102 @@ Edge-TTS (free), ElevenLabs (voice clone), Google TTS
 """
 
 import os
+import re
+import time
 import asyncio
+import math
 import logging
-import subprocess
+import threading
+from contextlib import contextmanager, suppress
+
+from tts_cache import tts_cache, cache_key
+from tts_router import tts_router
+from ffmpeg_pool import ffmpeg_pool
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 16 * 1024
+PART_SUFFIX = '.part'
+CHUNKED_MIN_WORDS = int(os.environ.get('OMMAE_CHUNKED_MIN_WORDS', '80'))
+CHUNKED_MAX_PARALLEL = int(os.environ.get('OMMAE_CHUNKED_MAX_PARALLEL', '4'))
+SENTENCE_GAP_MS = int(os.environ.get('OMMAE_SENTENCE_GAP_MS', '250'))
+TTS_TIMEOUTS = {
+    'elevenlabs': float(os.environ.get('OMMAE_TTS_TIMEOUT_ELEVENLABS', '30')),
+    'edge-tts': float(os.environ.get('OMMAE_TTS_TIMEOUT_EDGE', '20')),
+}
+ELEVENLABS_API_URL = os.environ.get('ELEVENLABS_API_URL', 'https://api.elevenlabs.io')
+TTS_ENGINES = os.environ.get('OMMAE_TTS_ENGINES', 'elevenlabs,edge-tts').split(',')
+AMBIENT_DIR = os.environ.get('OMMAE_AMBIENT_DIR', '/tmp/ommae-ambient')
+AMBIENT_BUCKETS = (15, 30, 60, 120, 300)
+
+
+@contextmanager
+def streaming_file(output_path):
+    """Write audio to output_path.part as it arrives; rename to output_path only once complete."""
+    part = output_path + PART_SUFFIX
+    try:
+        with open(part, 'wb') as f:
+            yield f
+        os.replace(part, output_path)
+    except BaseException:
+        if os.path.exists(part):
+            os.unlink(part)
+        raise
+
+
+def follow_audio(output_path, timeout=120, poll=0.05, alive=None):
+    """Yield the bytes of output_path, tailing the .part file while it is still being written.
+    alive() returning False (the producing job has finished) ends the wait for a file that never appeared;
+    while it returns True the idle timeout does not apply, since a job still queued has written nothing yet."""
+    part = output_path + PART_SUFFIX
+    deadline = time.monotonic() + timeout
+    f = None
+    while f is None:
+        for candidate in (output_path, part):
+            try:
+                f = open(candidate, 'rb')
+                break
+            except FileNotFoundError:
+                pass
+        if f is None:
+            if alive is not None and not alive():
+                try:
+                    f = open(output_path, 'rb')  # renamed in place just before the job finished
+                except FileNotFoundError:
+                    return
+            elif alive is None and time.monotonic() > deadline:
+                return
+            time.sleep(poll)
+    with f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if chunk:
+                deadline = time.monotonic() + timeout
+                yield chunk
+            elif os.path.exists(output_path) or not os.path.exists(part):
+                # The rename happens after the last write, so one more drain gets everything.
+                while chunk := f.read(CHUNK_SIZE):
+                    yield chunk
+                return
+            elif time.monotonic() > deadline and not (alive is not None and alive()):
+                return
+            else:
+                time.sleep(poll)
+
 
 async def generate_edge_tts(text, output_path, voice="en-US-GuyNeural"):
+    key = cache_key('edge-tts', voice, None, None, text)
+    if tts_cache.fetch(key, output_path):
+        return output_path
     try:
         import edge_tts
         communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(output_path)
+        with streaming_file(output_path) as f:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    f.write(chunk["data"])
+                    f.flush()
+        tts_cache.store(key, output_path)
         logger.info(f"Edge-TTS generated: {output_path}")
         return output_path
     except Exception as e:
@@ -23,39 +107,200 @@ async def generate_edge_tts(text, output_path, voice="en-US-GuyNeural"):
         raise
 
 
-def generate_elevenlabs(text, output_path, voice_id=None, api_key=None):
+class Cancelled(Exception):
+    """A TTS worker thread was told to stop because its caller gave up on it."""
+
+
+class AllEnginesFailed(Exception):
+    """No TTS engine produced audio and the caller asked for no ambient fill."""
+
+
+def generate_elevenlabs(text, output_path, voice_id=None, api_key=None, timeout=TTS_TIMEOUTS['elevenlabs'],
+                        cancel=None):
+    """Runs in a worker thread. Stops between chunks once `cancel` (a threading.Event) is set or
+    `timeout` seconds have passed since the call started, so an abandoned download does not keep writing."""
     import requests
+    deadline = time.monotonic() + timeout
     api_key = api_key or os.environ.get('ELEVENLABS_API_KEY')
     voice_id = voice_id or os.environ.get('ELEVENLABS_VOICE_ID', 'pNInz6obpgDQGcFmaJgB')
     if not api_key:
         raise ValueError("ELEVENLABS_API_KEY not set")
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    url = f"{ELEVENLABS_API_URL}/v1/text-to-speech/{voice_id}/stream"
     headers = {"Accept": "audio/mpeg", "Content-Type": "application/json", "xi-api-key": api_key}
     data = {"text": text, "model_id": "eleven_monolingual_v1", "voice_settings": {"stability": 0.5, "similarity_boost": 0.75}}
-    response = requests.post(url, json=data, headers=headers)
-    if response.status_code == 200:
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
+    key = cache_key('elevenlabs', voice_id, data['model_id'], data['voice_settings'], text)
+    if tts_cache.fetch(key, output_path):
         return output_path
+    response = requests.post(url, json=data, headers=headers, stream=True,
+                             timeout=max(deadline - time.monotonic(), 0.001))
+    with response:
+        if response.status_code == 200:
+            with streaming_file(output_path) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if (cancel is not None and cancel.is_set()) or time.monotonic() > deadline:
+                        raise Cancelled(f"ElevenLabs download abandoned: {output_path}")
+                    f.write(chunk)
+                    f.flush()
+            if cancel is not None and cancel.is_set():
+                with suppress(FileNotFoundError):
+                    os.unlink(output_path)
+                raise Cancelled(f"ElevenLabs download abandoned: {output_path}")
+            tts_cache.store(key, output_path)
+            return output_path
     raise Exception(f"ElevenLabs error: {response.status_code}")
 
 
-async def generate_audio(text, output_path, preferred_engine="auto"):
+async def generate_audio(text, output_path, preferred_engine="auto", chunked=None, ambient_fallback=True):
+    """chunked=None switches to sentence-chunked synthesis for scripts over CHUNKED_MIN_WORDS words.
+    If chunked synthesis fails, the whole text is synthesized in one call instead.
+    When every engine fails: ambient audio, or AllEnginesFailed with ambient_fallback=False."""
+    if chunked is None:
+        chunked = len(text.split()) > CHUNKED_MIN_WORDS
+    if chunked and len(split_sentences(text)) > 1:
+        try:
+            return await generate_audio_chunked(text, output_path, preferred_engine)
+        except Exception as e:
+            logger.warning(f"Chunked synthesis failed, retrying as one call: {type(e).__name__}: {e}")
+    # Each engine writes its own file and only the winner is renamed to output_path: a timed-out
+    # ElevenLabs thread cannot be cancelled by wait_for and may still be writing when the fallback runs.
+    cancel = threading.Event()
+    paths = {name: f"{output_path}.{name}" for name in ('edge-tts', 'elevenlabs')}
+    engines = {'edge-tts': lambda: generate_edge_tts(text, paths['edge-tts'])}
     if os.environ.get('ELEVENLABS_API_KEY'):
+        engines['elevenlabs'] = lambda: asyncio.to_thread(generate_elevenlabs, text, paths['elevenlabs'],
+                                                          timeout=TTS_TIMEOUTS['elevenlabs'], cancel=cancel)
+    try:
+        for name in tts_router.order(TTS_ENGINES, preferred_engine):
+            if name not in engines:
+                continue
+            try:
+                await tts_router.call(name, engines[name], TTS_TIMEOUTS[name])
+            except Exception as e:
+                logger.warning(f"TTS engine {name} failed, falling through: {type(e).__name__}: {e}")
+                continue
+            os.replace(paths[name], output_path)
+            return output_path
+    finally:
+        cancel.set()
+        for path in paths.values():
+            with suppress(FileNotFoundError):
+                os.unlink(path)
+    if not ambient_fallback:
+        raise AllEnginesFailed(f"No TTS engine could synthesize: {text[:60]!r}")
+    # ambient_bed may render on a cold instance and waits on its per-bucket lock: keep both off the loop
+    return await asyncio.to_thread(create_ambient_audio, text, output_path)
+
+
+def split_sentences(text, min_words=4):
+    """Split at sentence boundaries, folding fragments shorter than min_words into the next sentence."""
+    sentences, pending = [], ''
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        pending = f"{pending} {sentence}".strip()
+        if len(pending.split()) >= min_words:
+            sentences.append(pending)
+            pending = ''
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+async def generate_audio_chunked(text, output_path, preferred_engine="auto",
+                                 max_parallel=CHUNKED_MAX_PARALLEL, gap_ms=SENTENCE_GAP_MS):
+    """Synthesize each sentence concurrently, then join them in order with a fixed silence gap.
+    Raises if any sentence fails: ambient fill is only acceptable for the whole narration."""
+    sentences = split_sentences(text)
+    limit = asyncio.Semaphore(max_parallel)
+    chunk_paths = [f"{output_path}.{i:03d}.mp3" for i in range(len(sentences))]
+
+    async def synth(sentence, path):
+        async with limit:
+            return await generate_audio(sentence, path, preferred_engine, chunked=False, ambient_fallback=False)
+
+    tasks = [asyncio.ensure_future(synth(s, p)) for s, p in zip(sentences, chunk_paths)]
+    try:
         try:
-            return generate_elevenlabs(text, output_path)
-        except:
-            pass
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the other sentences (and their paid engine calls) before their files are cleaned up
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        await asyncio.to_thread(concat_audio, chunk_paths, output_path, gap_ms)
+        logger.info(f"Chunked audio: {len(sentences)} sentences -> {output_path}")
+        return output_path
+    finally:
+        for path in chunk_paths:
+            for leftover in (path, path + PART_SUFFIX):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+
+
+def probe_audio(path):
+    """(codec, sample_rate, channel_layout, bitrate_kbps) of the first audio stream, parsed from ffmpeg -i."""
+    result = ffmpeg_pool.run(['-i', path], check=False, label='probe')
+    match = re.search(r'Audio: (\w+).*?, (\d+) Hz, ([\w.()]+)[^\n]*?(?:, (\d+) kb/s)?\n', result['stderr'])
+    if not match:
+        raise RuntimeError(f"ffmpeg could not read {path}: {result['stderr'][-300:]}")
+    codec, rate, layout, kbps = match.groups()
+    return codec, int(rate), layout, int(kbps or 128)
+
+
+def concat_audio(paths, output_path, gap_ms=SENTENCE_GAP_MS):
+    """Join audio files in order with the concat demuxer. Stream copy when every part shares the
+    same codec parameters (the normal single-engine case); re-encode to MP3 only when engines were mixed."""
+    formats = {probe_audio(p) for p in paths}
+    codec, rate, layout, kbps = next(iter(formats))
+    lossless = len(formats) == 1 and codec == 'mp3'
+    silence = f"{output_path}.gap.mp3"
+    list_path = f"{output_path}.concat.txt"
     try:
-        return await generate_edge_tts(text, output_path)
-    except:
-        return create_ambient_audio(text, output_path)
+        parts = paths
+        if gap_ms > 0:
+            ffmpeg_pool.run(['-y', '-f', 'lavfi', '-i', f'anullsrc=r={rate}:cl={layout.split("(")[0]}',
+                             '-t', f'{gap_ms / 1000:.3f}', '-c:a', 'libmp3lame', '-b:a', f'{kbps}k', silence], label='silence')
+            parts = [x for p in paths for x in (p, silence)][:-1]
+        with open(list_path, 'w') as f:
+            f.writelines(f"file '{os.path.abspath(p)}'\n" for p in parts)
+        codec_args = ['-c', 'copy'] if lossless else ['-c:a', 'libmp3lame', '-b:a', f'{kbps}k', '-ar', str(rate)]
+        ffmpeg_pool.run(['-y', '-f', 'concat', '-safe', '0', '-i', list_path, *codec_args,
+                         '-f', 'mp3', output_path + PART_SUFFIX], label='concat')
+        os.replace(output_path + PART_SUFFIX, output_path)
+    finally:
+        for path in (silence, list_path, output_path + PART_SUFFIX):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+_ambient_locks = {}
+_ambient_locks_guard = threading.Lock()
+
+
+def ambient_bed(duration):
+    """Path to a pre-rendered pink-noise MP3 at least `duration` seconds long, rendered once per bucket."""
+    bucket = next((b for b in AMBIENT_BUCKETS if b >= duration), math.ceil(duration / 60) * 60)
+    path = os.path.join(AMBIENT_DIR, f"ambient_{bucket}s.mp3")
+    if os.path.exists(path):
+        return path
+    with _ambient_locks_guard:
+        lock = _ambient_locks.setdefault(bucket, threading.Lock())
+    with lock:
+        if not os.path.exists(path):
+            os.makedirs(AMBIENT_DIR, exist_ok=True)
+            ffmpeg_pool.run(['-y', '-f', 'lavfi', '-i', f'anoisesrc=d={bucket}:c=pink:a=0.002', '-ac', '1',
+                             '-ar', '44100', '-c:a', 'libmp3lame', '-b:a', '128k', '-f', 'mp3', path + PART_SUFFIX],
+                            label='ambient_bed')
+            os.replace(path + PART_SUFFIX, path)
+            logger.info(f"Rendered ambient bed: {path}")
+    return path
 
 
 def create_ambient_audio(text, output_path, duration=15):
     words = len(text.split())
     dur = max(duration, int(words / 2.5))
-    cmd = ['ffmpeg', '-y', '-f', 'lavfi', '-i', f'anoisesrc=d={dur}:c=pink:a=0.002', '-c:a', 'aac', output_path]
-    subprocess.run(cmd, capture_output=True)
+    ffmpeg_pool.run(['-y', '-i', ambient_bed(dur), '-t', str(dur), '-c', 'copy', output_path], label='ambient_trim')
     logger.info(f"Ambient audio: {output_path}")
     return output_path
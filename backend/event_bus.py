@@ -0,0 +1,75 @@
+"""
+OMMAE Event Bus v0.1 - Tell the dashboards, don't make them ask
+In-process publish/subscribe of video lifecycle events, served to browsers as server-sent events
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+SSE_HISTORY = int(os.environ.get('OMMAE_SSE_HISTORY', '1000'))
+SSE_MAX_SECONDS = float(os.environ.get('OMMAE_SSE_MAX_SECONDS', '300'))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('OMMAE_SSE_HEARTBEAT_SECONDS', '15'))
+SSE_RETRY_MS = 3000
+
+
+class EventBus:
+    """Numbered events kept in a ring buffer so a reconnecting client can resume from Last-Event-ID."""
+
+    def __init__(self, history: int = SSE_HISTORY):
+        self.events = deque(maxlen=history)
+        self.last_id = 0
+        self.subscribers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, kind: str, data: Dict) -> Dict:
+        with self._cond:
+            self.last_id += 1
+            event = {'id': self.last_id, 'type': kind, 'at': datetime.utcnow().isoformat(), 'data': data}
+            self.events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def since(self, last_id: int) -> Optional[List[Dict]]:
+        """Events after last_id, or None if some of them have already fallen out of the buffer
+        (or the id comes from before a restart) and the client must resync from /list-staging."""
+        with self._cond:
+            if last_id > self.last_id or (self.events and last_id < self.events[0]['id'] - 1):
+                return None
+            return [e for e in self.events if e['id'] > last_id]
+
+    def wait(self, last_id: int, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.last_id > last_id, timeout)
+
+    def stream(self, client: Optional[str] = None, last_id: Optional[int] = None,
+               max_seconds: float = SSE_MAX_SECONDS, heartbeat: float = SSE_HEARTBEAT_SECONDS) -> Iterator[str]:
+        """text/event-stream body. Closes after max_seconds; EventSource reconnects with Last-Event-ID."""
+        with self._cond:
+            self.subscribers += 1
+            cursor = self.last_id if last_id is None else last_id
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                events = self.since(cursor)
+                if events is None:
+                    cursor = self.last_id
+                    yield f"id: {cursor}\nevent: resync\ndata: {{}}\n\n"
+                    continue
+                for event in events:
+                    cursor = event['id']
+                    if client is None or event['data'].get('client') == client:
+                        yield f"id: {cursor}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                if not self.wait(cursor, min(heartbeat, max(0.0, deadline - time.monotonic()))):
+                    yield ": ping\n\n"
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {'last_id': self.last_id, 'buffered': len(self.events), 'subscribers': self.subscribers}
@@ -0,0 +1,293 @@
+"""
+OMMAE Event Log v0.1 - Count it when it happens, not at 3 AM
+Append-only, segment-rotated JSONL log of pipeline, TTS, posting and approval events,
+with per-day and per-client rollups maintained incrementally next to it
+"""
+import os
+import json
+import time
+import fcntl
+import heapq
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOG_DIR = os.environ.get('OMMAE_EVENT_LOG_DIR', '/tmp/ommae-events')
+SEGMENT_BYTES = int(os.environ.get('OMMAE_EVENT_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+MAX_SEGMENTS = int(os.environ.get('OMMAE_EVENT_MAX_SEGMENTS', '64'))
+ROLLUP_DAYS = int(os.environ.get('OMMAE_EVENT_ROLLUP_DAYS', '400'))
+# Rollups are checkpointed this often; a restart replays only the log written since the last checkpoint
+ROLLUP_FLUSH_EVENTS = int(os.environ.get('OMMAE_ROLLUP_FLUSH_EVENTS', '200'))
+ROLLUP_FLUSH_SECONDS = float(os.environ.get('OMMAE_ROLLUP_FLUSH_SECONDS', '10'))
+
+ROLLUP_FILE = 'rollups.json'
+SEGMENT_PREFIX, SEGMENT_SUFFIX = 'events-', '.jsonl'
+WRITER_PREFIX = 'w'
+ALL_CLIENTS = '*'
+
+# Client of the work in progress, for events recorded deep in shared code (TTS engines) that never see it
+current_client = ContextVar('ommae_event_client', default='')
+
+
+@contextmanager
+def client_scope(client: str):
+    token = current_client.set(client)
+    try:
+        yield
+    finally:
+        current_client.reset(token)
+
+
+def day_of(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d')
+
+
+def counters_for(record: Dict) -> List[str]:
+    """Rollup counters one record bumps: kind, kind:name, and the :failed variants."""
+    kind, name = record['k'], record.get('n')
+    keys = [kind] + ([f'{kind}:{name}'] if name else [])
+    if not record.get('ok', True):
+        keys += [f'{key}:failed' for key in keys]
+    return keys
+
+
+def apply(days: Dict, record: Dict):
+    day = days.setdefault(day_of(record['t']), {})
+    for client in {record.get('c') or '', ALL_CLIENTS}:
+        counts = day.setdefault(client, {})
+        for key in counters_for(record):
+            counts[key] = counts.get(key, 0) + 1
+
+
+def segments(directory: str) -> List[int]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(f[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for f in os.listdir(directory)
+                  if f.startswith(SEGMENT_PREFIX) and f.endswith(SEGMENT_SUFFIX))
+
+
+def segment_path(directory: str, n: int) -> str:
+    return os.path.join(directory, f'{SEGMENT_PREFIX}{n:06d}{SEGMENT_SUFFIX}')
+
+
+def read_from(directory: str, segment: int, offset: int) -> Iterator[Dict]:
+    for n in segments(directory):
+        if n < segment:
+            continue
+        try:
+            f = open(segment_path(directory, n), 'rb')
+        except FileNotFoundError:  # rotated away by its writer meanwhile
+            continue
+        with f:
+            if n == segment:
+                f.seek(offset)
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn by a crash, or still being written by another process
+
+
+def load_checkpoint(directory: str) -> Tuple[Dict, int, int]:
+    """(days, segment, offset) of a writer's last checkpoint; nothing checkpointed yet is (empty, 0, 0)."""
+    try:
+        with open(os.path.join(directory, ROLLUP_FILE)) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {}, 0, 0
+    return checkpoint['days'], checkpoint['segment'], checkpoint['offset']
+
+
+class EventLog:
+    """
+    Records are one compact JSON object per line: t (epoch seconds), k (kind), c (client),
+    n (name, e.g. stage, engine or platform), ok, plus any extra fields.
+
+    Every process writing to the same directory (the API and `python post_scheduler.py`, say) holds its
+    own writer slot w<N>, claimed with an exclusive flock and reused by the next process after it exits.
+    A slot has its own segments and its own rollups.json, so writers never overwrite each other;
+    reads add the other slots' checkpoints and the short tails written since them to this process's counts.
+    Segments roll over at SEGMENT_BYTES and the oldest are deleted past MAX_SEGMENTS;
+    the rollups keep every day's counts regardless, so reports never read the full log.
+    """
+
+    def __init__(self, path: str = EVENT_LOG_DIR):
+        self.path = path
+        self.appended = 0
+        self.days = {}  # this writer's counts: day -> client -> counter -> count
+        self.slot = None
+        self._lock = threading.Lock()
+        self._slot_lock = None
+        self._file = None
+        self._segment = 0
+        self._dirty = 0
+        self._flushed_at = time.monotonic()
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(self.path, f'{WRITER_PREFIX}{self.slot}')
+
+    # --- writing ---
+
+    def append(self, kind: str, client: str = '', name: Optional[str] = None, ok: bool = True, **fields) -> Optional[Dict]:
+        """Log one event and bump its rollups. Never raises: losing an event beats failing the request.
+        Without a client, the one set by client_scope (if any) is used."""
+        record = {'t': round(time.time(), 3), 'k': kind, 'c': client or current_client.get(), **({'n': name} if name else {}),
+                  **({} if ok else {'ok': False}), **fields}
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode()
+        try:
+            with self._lock:
+                self._open()
+                if self._file.tell() + len(line) > SEGMENT_BYTES and self._file.tell() > 0:
+                    self._rotate()
+                self._file.write(line)
+                self._file.flush()
+                apply(self.days, record)
+                self.appended += 1
+                self._dirty += 1
+                if self._dirty >= ROLLUP_FLUSH_EVENTS or time.monotonic() - self._flushed_at > ROLLUP_FLUSH_SECONDS:
+                    self._checkpoint()
+        except OSError as e:
+            logger.warning(f"Event log append failed: {e}")
+            return None
+        return record
+
+    # --- segments ---
+
+    def _claim_slot(self):
+        """Take the lowest writer slot no live process holds. The flock dies with the process. Lock held."""
+        os.makedirs(self.path, exist_ok=True)
+        slot = 0
+        while True:
+            handle = open(os.path.join(self.path, f'{WRITER_PREFIX}{slot}.lock'), 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                slot += 1
+                continue
+            self.slot, self._slot_lock = slot, handle
+            return
+
+    def _open(self):
+        """Claim a slot, load its checkpoint, replay the tail written after it and open its newest segment. Lock held."""
+        if self._file is not None:
+            return
+        self._claim_slot()
+        os.makedirs(self.directory, exist_ok=True)
+        self.days, segment, offset = load_checkpoint(self.directory)
+        for record in read_from(self.directory, segment, offset):
+            apply(self.days, record)
+            self._dirty += 1
+        existing = segments(self.directory)
+        self._segment = existing[-1] if existing else 1
+        self._file = open(segment_path(self.directory, self._segment), 'ab')
+        if self._file.tell():
+            with open(segment_path(self.directory, self._segment), 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write(b'\n')  # seal a record torn by a crash
+        if self._dirty:
+            self._checkpoint()
+
+    def _rotate(self):
+        self._checkpoint()
+        self._file.close()
+        self._segment += 1
+        self._file = open(segment_path(self.directory, self._segment), 'ab')
+        for old in segments(self.directory)[:-MAX_SEGMENTS]:
+            os.unlink(segment_path(self.directory, old))
+
+    def _peers(self) -> List[str]:
+        """Directories of every other writer slot, live or not."""
+        names = os.listdir(self.path) if os.path.isdir(self.path) else []
+        return [os.path.join(self.path, name) for name in sorted(names)
+                if name.startswith(WRITER_PREFIX) and name[len(WRITER_PREFIX):].isdigit()
+                and os.path.isdir(os.path.join(self.path, name)) and int(name[len(WRITER_PREFIX):]) != self.slot]
+
+    def replay(self, since: float = 0) -> Iterator[Dict]:
+        """Every retained record with t >= since, across all writers in time order.
+        For audits and rebuilding rollups, not for reports."""
+        with self._lock:
+            self._open()
+            self._file.flush()
+            directories = [self.directory] + self._peers()
+        streams = [read_from(directory, 0, 0) for directory in directories]
+        return (r for r in heapq.merge(*streams, key=lambda r: r.get('t', 0)) if r.get('t', 0) >= since)
+
+    # --- rollups ---
+
+    def _checkpoint(self):
+        """Atomically persist this writer's rollups with the log position they include. Lock held."""
+        for day in sorted(self.days)[:-ROLLUP_DAYS]:
+            del self.days[day]
+        path = os.path.join(self.directory, ROLLUP_FILE)
+        offset = self._file.tell() if self._file else 0
+        with open(path + '.part', 'w') as f:
+            json.dump({'segment': self._segment, 'offset': offset, 'days': self.days}, f, separators=(',', ':'))
+        os.replace(path + '.part', path)
+        self._dirty, self._flushed_at = 0, time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None and self._dirty:
+                self._file.flush()
+                self._checkpoint()
+
+    def _day(self, day: str) -> Dict[str, Dict[str, int]]:
+        """client -> counters for one day, summed over all writers. Peers cost a checkpoint read
+        plus at most ROLLUP_FLUSH_EVENTS records each, never their full history."""
+        with self._lock:
+            self._open()
+            merged = {client: dict(counts) for client, counts in self.days.get(day, {}).items()}
+        for directory in self._peers():
+            days, segment, offset = load_checkpoint(directory)
+            for record in read_from(directory, segment, offset):
+                apply(days, record)
+            for client, counts in days.get(day, {}).items():
+                total = merged.setdefault(client, {})
+                for key, count in counts.items():
+                    total[key] = total.get(key, 0) + count
+        return merged
+
+    def rollup(self, day: Optional[str] = None, client: str = ALL_CLIENTS) -> Dict[str, int]:
+        """Counters for one UTC day (default today) and client ('*' for all), without scanning history."""
+        return self._day(day or day_of(time.time())).get(client, {})
+
+    def clients(self, day: Optional[str] = None) -> List[str]:
+        return sorted(c for c in self._day(day or day_of(time.time())) if c not in ('', ALL_CLIENTS))
+
+    def report_stats(self, day: Optional[str] = None, client: str = ALL_CLIENTS) -> Dict:
+        """The stats dict Ara.daily_report expects, straight from the rollups."""
+        counts = self.rollup(day, client)
+        return {'day': day or day_of(time.time()), 'client': client,
+                'content_count': counts.get('staged', 0),
+                'platform_posts': counts.get('post', 0) - counts.get('post:failed', 0),  # one per platform a video reached
+                'posts_failed': counts.get('post:failed', 0),
+                'approved': counts.get('approved', 0),
+                'pipeline_failures': counts.get('pipeline:failed', 0),
+                'generation_failures': counts.get('generation:failed', 0),
+                'tts_calls': counts.get('tts', 0), 'tts_failures': counts.get('tts:failed', 0)}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'writer': self.slot, 'segment': self._segment, 'segment_bytes': self._file.tell() if self._file else 0,
+                    'appended': self.appended, 'rollup_days': len(self.days)}
+
+
+def yesterday() -> str:
+    return (datetime.utcnow() - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+# Shared instance: every module in this process records into the same writer slot
+event_log = EventLog()
+atexit.register(event_log.flush)
+register_collector(lambda: [('ommae_events_appended_total', 'counter', {}, event_log.appended)])
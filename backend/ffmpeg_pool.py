@@ -0,0 +1,99 @@
+"""
+OMMAE FFmpeg Pool v0.1 - One encoder per core, no more fork bombs
+Bounded ffmpeg execution with a queue, deadlines and exit-code/stderr capture
+"""
+import os
+import time
+import asyncio
+import logging
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from metrics import describe, observe, span, register_collector
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+FFMPEG_WORKERS = int(os.environ.get('OMMAE_FFMPEG_WORKERS', '0')) or os.cpu_count() or 2
+FFMPEG_TIMEOUT = float(os.environ.get('OMMAE_FFMPEG_TIMEOUT', '300'))
+
+
+class FFmpegError(Exception):
+    """ffmpeg exited non-zero or hit its deadline."""
+
+    def __init__(self, message: str, result: Optional[Dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+class FFmpegPool:
+    """Runs ffmpeg invocations on at most `workers` processes at once; the rest wait in a FIFO queue."""
+
+    def __init__(self, workers: int = FFMPEG_WORKERS):
+        self.workers = workers
+        self.queued = self.running = self.completed = self.failed = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ommae-ffmpeg')
+
+    def submit(self, args: List[str], timeout: float = FFMPEG_TIMEOUT, check: bool = True, label: str = 'ffmpeg') -> Future:
+        """Queue `ffmpeg <args>`. The future resolves to {returncode, stderr, queued_ms, run_ms} or raises FFmpegError."""
+        with self._lock:
+            self.queued += 1
+        return self._executor.submit(self._run, list(args), timeout, check, time.monotonic(), label)
+
+    def run(self, args: List[str], timeout: float = FFMPEG_TIMEOUT, check: bool = True, label: str = 'ffmpeg') -> Dict:
+        """Blocking submit. Must not be called from inside a pool job."""
+        return self.submit(args, timeout, check, label).result()
+
+    async def run_async(self, args: List[str], timeout: float = FFMPEG_TIMEOUT, check: bool = True,
+                        label: str = 'ffmpeg') -> Dict:
+        return await asyncio.wrap_future(self.submit(args, timeout, check, label))
+
+    def _run(self, args: List[str], timeout: float, check: bool, submitted: float, label: str) -> Dict:
+        started = time.monotonic()
+        observe('ommae_ffmpeg_queue_wait_seconds', started - submitted, name=label)
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        cmd = [FFMPEG_BIN, '-hide_banner', '-nostdin', *args]
+        try:
+            with span('ffmpeg', label) as s:
+                proc = subprocess.run(cmd, capture_output=True, text=True, errors='replace', timeout=timeout)
+                if check and proc.returncode != 0:
+                    s.fail()
+            result = {'returncode': proc.returncode, 'stderr': proc.stderr,
+                      'queued_ms': round((started - submitted) * 1000, 1),
+                      'run_ms': round((time.monotonic() - started) * 1000, 1)}
+        except subprocess.TimeoutExpired as e:
+            self._finish(False)
+            raise FFmpegError(f"ffmpeg timed out after {timeout}s: {' '.join(cmd)}") from e
+        except Exception:
+            self._finish(False)
+            raise
+        self._finish(result['returncode'] == 0 or not check)
+        if check and result['returncode'] != 0:
+            logger.error(f"ffmpeg exited {result['returncode']}: {result['stderr'][-500:]}")
+            raise FFmpegError(f"ffmpeg exited {result['returncode']}: {result['stderr'][-300:]}", result)
+        return result
+
+    def _finish(self, ok: bool):
+        with self._lock:
+            self.running -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'workers': self.workers, 'queued': self.queued, 'running': self.running,
+                    'completed': self.completed, 'failed': self.failed}
+
+
+# Shared instance: every ffmpeg invocation in the backend goes through here
+ffmpeg_pool = FFmpegPool()
+describe('ommae_ffmpeg_queue_wait_seconds', 'histogram', 'Time ffmpeg jobs spent waiting for a pool worker.')
+register_collector(lambda: [('ommae_ffmpeg_queue_depth', 'gauge', {}, ffmpeg_pool.queued),
+                            ('ommae_ffmpeg_running', 'gauge', {}, ffmpeg_pool.running)])
@@ -0,0 +1,103 @@
+"""
+OMMAE Idempotency v0.1 - Pay for it once
+Singleflight table: duplicates attach to the call in flight, finished results replay within a window
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.environ.get('OMMAE_IDEMPOTENCY_TTL', '3600'))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get('OMMAE_IDEMPOTENCY_MAX_KEYS', '1000'))
+
+
+def fingerprint(*parts) -> str:
+    """Stable key for a request without an explicit Idempotency-Key."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+class SingleFlight:
+    """
+    At most one call per key runs at a time; callers arriving meanwhile share its outcome.
+    Results accepted by `replay_if` are replayed for `ttl` seconds; exceptions are never kept,
+    so a failed call can be retried straight away. Safe across threads and event loops.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS,
+                 replay_if: Callable[[object], bool] = lambda result: True):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.replay_if = replay_if
+        self.calls = self.coalesced = self.replayed = 0
+        self._lock = threading.Lock()
+        self._flights = {}           # key -> Future of the call in flight
+        self._done = OrderedDict()   # key -> (expires, result), oldest first
+
+    def _claim(self, key: str):
+        """(replayed result, None), (None, future to wait on) or (None, None) when the caller must run it."""
+        with self._lock:
+            entry = self._done.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.replayed += 1
+                return entry, None
+            self._done.pop(key, None)
+            if key in self._flights:
+                self.coalesced += 1
+                return None, self._flights[key]
+            self._flights[key] = Future()
+            self.calls += 1
+            return None, None
+
+    def _settle(self, key: str, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            future = self._flights.pop(key)
+            if error is None and self.ttl > 0 and self.replay_if(result):
+                self._done[key] = (time.monotonic() + self.ttl, result)
+                self._done.move_to_end(key)
+                while len(self._done) > self.max_keys:
+                    self._done.popitem(last=False)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def run(self, key: str, fn: Callable, *args, **kwargs):
+        entry, waiting = self._claim(key)
+        if entry:
+            return entry[1]
+        if waiting:
+            return waiting.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, error=e)
+            raise
+        self._settle(key, result)
+        return result
+
+    async def run_async(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs):
+        entry, waiting = self._claim(key)
+        if entry:
+            return entry[1]
+        if waiting:
+            return await asyncio.wrap_future(waiting)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, error=e)
+            raise
+        self._settle(key, result)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'in_flight': len(self._flights), 'replayable': len(self._done), 'calls': self.calls,
+                    'coalesced': self.coalesced, 'replayed': self.replayed}
@@ -0,0 +1,153 @@
+"""
+OMMAE Job Queue v0.1 - Accept fast, generate in the background
+Bounded worker pool for slow generation jobs (Gemini + ElevenLabs)
+"""
+import os
+import uuid
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OMMAE_WORKERS = int(os.environ.get('OMMAE_WORKERS', '4'))
+OMMAE_MAX_QUEUE = int(os.environ.get('OMMAE_MAX_QUEUE', '64'))
+OMMAE_JOB_HISTORY = int(os.environ.get('OMMAE_JOB_HISTORY', '500'))
+# Jobs live in this process's memory and keep running after the 202 is sent. On Cloud Run that needs CPU
+# always allocated (--no-cpu-throttling) or they stall, and one instance (--max-instances=1, as the SQLite
+# store already requires) so /job-status and /stream-audio reach the process holding the job.
+# Cloud Functions offers neither. Set OMMAE_BACKGROUND_CPU=1 to confirm the service is deployed that way.
+ON_SERVERLESS = bool(os.environ.get('K_SERVICE') or os.environ.get('FUNCTION_TARGET'))
+BACKGROUND_CPU = os.environ.get('OMMAE_BACKGROUND_CPU', '').lower() in ('1', 'true', 'yes')
+
+
+class QueueFull(Exception):
+    """Raised when the pending job backlog is at capacity."""
+
+
+class KeyConflict(Exception):
+    """Raised when an idempotency key still in use is reused for a different request."""
+
+
+class JobQueue:
+    """Runs submitted callables on a fixed pool of worker threads and tracks their status."""
+
+    def __init__(self, workers: int = OMMAE_WORKERS, max_queue: int = OMMAE_MAX_QUEUE,
+                 history: int = OMMAE_JOB_HISTORY):
+        if ON_SERVERLESS and not BACKGROUND_CPU:
+            raise RuntimeError("Background jobs need CPU always allocated and a single instance: deploy with "
+                               "--no-cpu-throttling --max-instances=1 and set OMMAE_BACKGROUND_CPU=1")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.history = history
+        self.jobs = OrderedDict()
+        self.keys = {}  # idempotency key -> (job_id, replay window in seconds, request fingerprint)
+        self.attached = 0
+        self.finished = {'done': 0, 'failed': 0}  # lifetime totals: evicted jobs still count
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ommae-job')
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Dict:
+        """Enqueue fn(*args, **kwargs) and return the job record immediately."""
+        return self.submit_once(None, None, 0, None, fn, *args, **kwargs)[0]
+
+    def submit_once(self, key: Optional[str], request: Optional[str], window: float, fields: Optional[Dict],
+                    fn: Callable, *args, **kwargs) -> Tuple[Dict, bool]:
+        """Like submit, but a job already queued or running under key is returned instead of a new one,
+        and so is one that finished successfully less than window seconds ago. request fingerprints what
+        was asked for: reusing a live key for a different request raises KeyConflict. fields are extra
+        public values stored on a new job. Returns (job record, created)."""
+        with self._lock:
+            existing = self._existing(key)
+            if existing and self.keys[key][2] != request:
+                raise KeyConflict(f"Key {key!r} was first used for a different request")
+            if existing:
+                self.attached += 1
+                return self.public(existing), False
+            if self._pending >= self.max_queue:
+                raise QueueFull(f"{self._pending} jobs pending (max {self.max_queue})")
+            self._pending += 1
+            job_id = f"job-{uuid.uuid4().hex[:12]}"
+            job = {'jobId': job_id, **(fields or {}), 'status': 'queued', 'submittedAt': datetime.utcnow().isoformat(),
+                   'startedAt': None, 'finishedAt': None, 'queueMs': None, 'runMs': None,
+                   'result': None, 'error': None, '_t': time.monotonic(), '_done': None}
+            self.jobs[job_id] = job
+            if key is not None:
+                self.keys[key] = (job_id, window, request)
+            self._evict()
+            snapshot = self.public(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return snapshot, True
+
+    def _existing(self, key: Optional[str]) -> Optional[Dict]:
+        """The live or replayable job for key. Caller holds the lock."""
+        if key is None or key not in self.keys:
+            return None
+        job_id, window, _ = self.keys[key]
+        job = self.jobs.get(job_id)
+        if job and (job['status'] in ('queued', 'running') or
+                    (job['status'] == 'done' and time.monotonic() - job['_done'] < window)):
+            return job
+        del self.keys[key]
+        return None
+
+    def _run(self, job: Dict, fn: Callable, args, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self._pending -= 1
+            job['status'], job['startedAt'] = 'running', datetime.utcnow().isoformat()
+            job['queueMs'] = round((started - job['_t']) * 1000, 1)
+        try:
+            result, error, status = fn(*args, **kwargs), None, 'done'
+        except Exception as e:
+            logger.exception(f"Job {job['jobId']} failed")
+            result, error, status = None, str(e), 'failed'
+        with self._lock:
+            job['status'], job['result'], job['error'] = status, result, error
+            job['finishedAt'], job['_done'] = datetime.utcnow().isoformat(), time.monotonic()
+            job['runMs'] = round((time.monotonic() - started) * 1000, 1)
+            self.finished[status] += 1
+
+    def _evict(self):
+        """Drop the oldest finished jobs once the history limit is exceeded. Caller holds the lock."""
+        excess = len(self.jobs) - self.history
+        if excess <= 0:
+            return
+        evicted = set([j for j, v in self.jobs.items() if v['status'] in ('done', 'failed')][:excess])
+        for job_id in evicted:
+            del self.jobs[job_id]
+        for key in [k for k, (job_id, _, _) in self.keys.items() if job_id in evicted]:
+            del self.keys[key]
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return self.public(job) if job else None
+
+    def by_video(self, video_id: str) -> Optional[Dict]:
+        """The newest job whose videoIds include video_id, or None."""
+        with self._lock:
+            for job in reversed(self.jobs.values()):
+                if video_id in job.get('videoIds', ()):
+                    return self.public(job)
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            return {'workers': self.workers, 'max_queue': self.max_queue, 'attached': self.attached, **counts,
+                    'finished': dict(self.finished)}
+
+    @staticmethod
+    def public(job: Dict) -> Dict:
+        return {k: v for k, v in job.items() if not k.startswith('_')}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
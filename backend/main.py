@@ -3,31 +3,78 @@ OMMAE v0.1 - Video Generation API
 Real Gemini + ElevenLabs + FFmpeg Pipeline
 """
 import functions_framework
-from flask import Flask, request, jsonify
-import os, json, uuid, subprocess
+from flask import Response  # already loaded by functions_framework, so free
+import os, re, json, time, uuid, hashlib
 from datetime import datetime
-import google.generativeai as genai
+from functools import lru_cache
+from job_queue import JobQueue, QueueFull, KeyConflict
+from video_store import VideoStore
+from tts_cache import tts_cache, cache_key
+from tts_router import tts_router
+from post_scheduler import PostQueue, check_platforms
+from audio_generator import CHUNK_SIZE, TTS_TIMEOUTS, streaming_file, follow_audio
+from metrics import span, register_collector, render as render_metrics
+from script_variants import MAX_VARIANTS, variants_prompt, parse_variants
+from event_bus import EventBus
+from idempotency import IDEMPOTENCY_TTL, fingerprint
+from event_log import event_log, client_scope, yesterday
 
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
-if GEMINI_API_KEY: genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT', '')  # e.g. a local stand-in server (REST transport)
 
 ELEVENLABS_API_KEY = os.environ.get('ELEVENLABS_API_KEY', '')
+ELEVENLABS_API_URL = os.environ.get('ELEVENLABS_API_URL', 'https://api.elevenlabs.io')
 ELEVENLABS_VOICE_ID = os.environ.get('ELEVENLABS_VOICE_ID', 'CT96S5RC77U74JDR24HG')
 
-STAGING_VIDEOS = {}
-APPROVED_VIDEOS = {}
+VIDEOS = VideoStore()
+POST_QUEUE = PostQueue()
+DEFAULT_HASHTAGS = ["mohawkmedibles", "cannabis", "indigenous", "wellness"]
+JOBS = JobQueue()
+EVENTS = EventBus()  # staged / approved / failed, pushed to dashboards over /events
 
-def generate_audio_elevenlabs(text, output_path):
+def collect_metrics():
+    jobs = JOBS.stats()
+    for status in ('queued', 'running'): yield 'ommae_jobs', 'gauge', {'status': status}, jobs[status]
+    for status in ('done', 'failed'): yield 'ommae_jobs_finished_total', 'counter', {'status': status}, jobs['finished'][status]
+    yield 'ommae_jobs_attached_total', 'counter', {}, jobs['attached']
+    for status in ('staged', 'approved'): yield 'ommae_videos', 'gauge', {'status': status}, VIDEOS.count(status)
+    for platform, by_status in POST_QUEUE.stats().items():
+        for status, count in by_status.items(): yield 'ommae_posts', 'gauge', {'platform': platform, 'status': status}, count
+    yield 'ommae_sse_subscribers', 'gauge', {}, EVENTS.stats()['subscribers']
+
+register_collector(collect_metrics)
+
+# Heavy SDKs load on first use and clients are built once per instance, keeping them off the cold-start path
+@lru_cache(maxsize=None)
+def gemini_model(name='gemini-1.5-flash'):
+    import google.generativeai as genai
+    if GEMINI_API_ENDPOINT: genai.configure(api_key=GEMINI_API_KEY, transport='rest', client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+    else: genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(name)
+
+@lru_cache(maxsize=None)
+def http_session():
     import requests
+    return requests.Session()
+
+def generate_audio_elevenlabs(text, output_path):
     if not ELEVENLABS_API_KEY: return None
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+    url = f"{ELEVENLABS_API_URL}/v1/text-to-speech/{ELEVENLABS_VOICE_ID}/stream"
     headers = {"Accept": "audio/mpeg", "Content-Type": "application/json", "xi-api-key": ELEVENLABS_API_KEY}
     data = {"text": text, "model_id": "eleven_turbo_v2_5", "voice_settings": {"stability": 0.5, "similarity_boost": 0.85, "style": 0.6, "use_speaker_boost": True}}
+    key = cache_key('elevenlabs', ELEVENLABS_VOICE_ID, data['model_id'], data['voice_settings'], text)
+    if tts_cache.fetch(key, output_path): return output_path
+    if not tts_router.allow('elevenlabs'): return None
+    deadline = time.monotonic() + TTS_TIMEOUTS['elevenlabs']  # requests' timeout is per read, not for the whole download
     try:
-        response = requests.post(url, json=data, headers=headers, timeout=60)
-        if response.status_code == 200:
-            with open(output_path, 'wb') as f: f.write(response.content)
-            return output_path
+        with tts_router.track('elevenlabs'), http_session().post(url, json=data, headers=headers, timeout=TTS_TIMEOUTS['elevenlabs'], stream=True) as response:
+            if response.status_code != 200: raise RuntimeError(f"HTTP {response.status_code}")
+            with streaming_file(output_path) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if time.monotonic() > deadline: raise TimeoutError(f"download exceeded {TTS_TIMEOUTS['elevenlabs']}s")
+                    f.write(chunk); f.flush()
+        tts_cache.store(key, output_path)
+        return output_path
     except Exception as e: print(f"ElevenLabs error: {e}")
     return None
 
@@ -44,51 +91,156 @@ def generate_script_gemini(topic):
     if not GEMINI_API_KEY:
         return f"Look. {topic.split()[0].capitalize()} isn't complicated. We're just trying to help you feel better. The natural way. Mohawk Medibles. Real wellness. Real simple. Check us out."
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(EUGENE_VOICE_PROMPT.format(topic=topic))
+        with span('llm', 'gemini'): response = gemini_model().generate_content(EUGENE_VOICE_PROMPT.format(topic=topic))
         return response.text.strip().replace('"', '').replace('*', '')
     except: return "Look. Wellness shouldn't be complicated. Mohawk Medibles. We keep it simple. We keep it real."
 
-def create_video_response(client, topic, use_real_tts=True):
-    video_id = f"video-{uuid.uuid4().hex[:8]}"
-    script = generate_script_gemini(topic)
-    audio_path, video_url, real_generation = f"/tmp/{video_id}_audio.mp3", None, False
+OFFLINE_HOOKS = ["Look.", "I get it.", "Here's the thing.", "Real talk.", "Let me keep this simple."]
+
+def generate_script_variants(topic, n):
+    """Up to n distinct scripts for one topic from a single Gemini request (A/B hooks without N round trips)."""
+    if n == 1: return [generate_script_gemini(topic)]
+    if not GEMINI_API_KEY:
+        word = topic.split()[0].capitalize()
+        return [f"{hook} {word} isn't complicated. We're just trying to help you feel better. The natural way. Mohawk Medibles. Real wellness. Real simple." for hook in OFFLINE_HOOKS[:n]]
+    try:
+        with span('llm', 'gemini'): response = gemini_model().generate_content(variants_prompt(EUGENE_VOICE_PROMPT.format(topic=topic), n), generation_config={'response_mime_type': 'application/json'})
+        variants = parse_variants(response.text, n)
+    except Exception as e: print(f"Gemini variants error: {e}"); variants = []
+    return variants or ["Look. Wellness shouldn't be complicated. Mohawk Medibles. We keep it simple. We keep it real."]
+
+VIDEO_ID_RE = re.compile(r'^video-[0-9a-f]{8}$')
+
+def new_video_id(): return f"video-{uuid.uuid4().hex[:8]}"
+
+def audio_path_for(video_id): return f"/tmp/{video_id}_audio.mp3"
+
+def create_video_response(client, topic, use_real_tts=True, video_id=None, script=None, variant=None):
+    video_id = video_id or new_video_id()
+    script = script or generate_script_gemini(topic)
+    audio_path, video_url, real_generation = audio_path_for(video_id), None, False
     if use_real_tts and ELEVENLABS_API_KEY:
         if generate_audio_elevenlabs(script, audio_path): real_generation = True
     video_data = {"videoId": video_id, "client": client, "topic": topic, "script": script,
         "audioUrl": f"/staging/{client}/{video_id}.mp3" if real_generation else f"https://storage.googleapis.com/ommae-staging/{client}/audio/{video_id}.mp3",
         "videoUrl": f"/staging/{client}/{video_id}.mp4", "driveUrl": f"https://drive.google.com/file/d/{video_id}/view",
         "realGeneration": real_generation, "status": "staged", "createdAt": datetime.utcnow().isoformat(), "approvedAt": None}
-    STAGING_VIDEOS[video_id] = video_data
+    if variant: video_data.update(variant)
+    VIDEOS.add(video_data)
+    event_log.append('staged', client, video=video_id, real=real_generation)
+    EVENTS.publish('staged', video_data)
     return video_data
 
+def create_video_variants(client, topic, video_ids, use_real_tts=True):
+    """One LLM call for all scripts, then each variant is staged as its own video. A short reply stages fewer videos."""
+    scripts = generate_script_variants(topic, len(video_ids))
+    return [create_video_response(client, topic, use_real_tts, video_id, script, {"variantGroup": video_ids[0], "variant": i + 1})
+            for i, (video_id, script) in enumerate(zip(video_ids, scripts))]
+
+def run_generation(fn, client, topic, **kwargs):
+    """Job body for /generate-video; a failure is pushed to dashboards as well as recorded on the job."""
+    try:
+        with client_scope(client): return fn(client, topic, **kwargs)
+    except Exception as e:
+        event_log.append('generation', client, ok=False, error=str(e)[:200])
+        EVENTS.publish('failed', {"client": client, "topic": topic, "videoIds": kwargs.get('video_ids') or [kwargs.get('video_id')], "error": str(e)})
+        raise
+
 @functions_framework.http
 def main(request):
     if request.method == 'OPTIONS':
-        return ('', 204, {'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS', 'Access-Control-Allow-Headers': 'Content-Type'})
-    headers = {'Access-Control-Allow-Origin': '*'}
+        return ('', 204, {'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS', 'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Last-Event-ID, Idempotency-Key'})
+    headers = {'Access-Control-Allow-Origin': '*', 'Access-Control-Expose-Headers': 'ETag, Idempotent-Replayed'}
     path = request.path
     if path in ['/', '']:
         return (json.dumps({"status": "operational", "version": "0.1.1", "message": "OMMAE - Real Audio/Video Pipeline",
             "services": {"gemini": "ready" if GEMINI_API_KEY else "not_configured", "elevenlabs": "ready" if ELEVENLABS_API_KEY else "not_configured"},
-            "staged_videos": len(STAGING_VIDEOS)}), 200, headers)
+            "staged_videos": VIDEOS.count('staged'), "jobs": JOBS.stats(), "tts_cache": tts_cache.stats(), "tts_engines": tts_router.state(), "post_queue": POST_QUEUE.stats(), "events": EVENTS.stats(),
+            "today": event_log.report_stats(), "event_log": event_log.stats()}), 200, headers)
     if path == '/generate-video':
-        if request.method == 'GET': return (json.dumps({"message": "POST with {client, topic}"}), 200, headers)
+        if request.method == 'GET': return (json.dumps({"message": "POST with {client, topic, variants?}"}), 200, headers)
         if request.method == 'POST':
             data = request.get_json() or {}
-            video_data = create_video_response(data.get('client', 'mohawkmedibles'), data.get('topic', 'cannabis wellness'))
-            return (json.dumps({"videoId": video_data["videoId"], "script": video_data["script"], "driveUrl": video_data["driveUrl"],
-                "realGeneration": video_data["realGeneration"], "status": "staged"}), 200, headers)
+            client, topic = data.get('client', 'mohawkmedibles'), data.get('topic', 'cannabis wellness')
+            try: variants = int(data.get('variants', 1))
+            except (TypeError, ValueError): variants = 0
+            if not 1 <= variants <= MAX_VARIANTS: return (json.dumps({"error": f"variants must be an integer from 1 to {MAX_VARIANTS}"}), 400, headers)
+            # Duplicates attach to the job in flight; with an Idempotency-Key a finished job is also replayed for OMMAE_IDEMPOTENCY_TTL
+            given = request.headers.get('Idempotency-Key') or data.get('idempotencyKey')
+            asked = fingerprint('generate-video', client, topic, variants)
+            key, window = (f"{client}|{given}", IDEMPOTENCY_TTL) if given else (asked, 0)
+            video_ids = [new_video_id() for _ in range(variants)]
+            if variants > 1: fn, kwargs = create_video_variants, {"video_ids": video_ids}
+            else: fn, kwargs = create_video_response, {"video_id": video_ids[0]}
+            try: job, created = JOBS.submit_once(key, asked, window, {"videoIds": video_ids}, run_generation, fn, client, topic, **kwargs)
+            except QueueFull as e: return (json.dumps({"error": "Queue full, retry later", "detail": str(e)}), 503, {**headers, 'Retry-After': '5'})
+            except KeyConflict: return (json.dumps({"error": "Idempotency-Key was already used with a different topic or variants"}), 422, headers)
+            video_ids = job["videoIds"]
+            body = {"jobId": job["jobId"], "status": job["status"], "statusUrl": f"/job-status?jobId={job['jobId']}"}
+            if len(video_ids) > 1: body.update(videoIds=video_ids, audioStreamUrls=[f"/stream-audio/{v}" for v in video_ids])
+            else: body.update(videoId=video_ids[0], audioStreamUrl=f"/stream-audio/{video_ids[0]}")
+            return (json.dumps(body), 202, headers if created else {**headers, 'Idempotent-Replayed': 'true'})
+    if path == '/job-status':
+        job = JOBS.get(request.args.get('jobId', ''))
+        if not job: return (json.dumps({"error": "Job not found"}), 404, headers)
+        result, fields = job.pop("result"), ("videoId", "script", "driveUrl", "realGeneration", "status")
+        if isinstance(result, list): job["videos"] = [{k: video[k] for k in fields + ("variant",)} for video in result]
+        elif result: job["video"] = {k: result[k] for k in fields}
+        return (json.dumps(job), 200, headers)
     if path == '/list-staging':
-        client = request.args.get('client', 'mohawkmedibles')
-        return (json.dumps({"client": client, "videos": [v for v in STAGING_VIDEOS.values() if v['client'] == client]}), 200, headers)
+        # ?since=<syncCursor> returns only videos added or changed since then (any status); both modes carry an ETag
+        client, status, since = request.args.get('client', 'mohawkmedibles'), request.args.get('status', 'staged'), request.args.get('since')
+        try: cursor, limit, since = int(request.args.get('cursor') or 0), min(max(int(request.args.get('limit', 50)), 1), 200), None if since is None else int(since)
+        except ValueError: return (json.dumps({"error": "cursor, limit and since must be integers"}), 400, headers)
+        version = VIDEOS.version(client)  # read before the rows: a change in between is re-sent next time, never lost
+        etag = hashlib.sha1(f"{client}|{status}|{cursor}|{limit}|{since}|{version}".encode()).hexdigest()[:20]
+        headers = {**headers, 'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains_weak(etag): return ('', 304, headers)
+        if since is not None:
+            videos, sync_cursor = VIDEOS.changes(client, since, limit)
+            return (json.dumps({"client": client, "since": since, "videos": videos, "syncCursor": sync_cursor, "more": len(videos) == limit}), 200, headers)
+        videos, next_cursor = VIDEOS.list(client, status if status != 'all' else None, cursor, limit)
+        return (json.dumps({"client": client, "status": status, "videos": videos, "nextCursor": next_cursor, "syncCursor": version}), 200, headers)
+    if path == '/events':
+        try: last_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0) or None
+        except ValueError: last_id = None
+        return Response(EVENTS.stream(request.args.get('client'), last_id), 200, {**headers, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}, mimetype='text/event-stream')
     if path == '/approve' and request.method == 'POST':
-        video_id = (request.get_json() or {}).get('videoId')
-        if video_id and video_id in STAGING_VIDEOS:
-            video = STAGING_VIDEOS.pop(video_id)
-            video['status'], video['approvedAt'] = 'approved', datetime.utcnow().isoformat()
-            APPROVED_VIDEOS[video_id] = video
-            return (json.dumps({"videoId": video_id, "status": "approved"}), 200, headers)
+        data = request.get_json() or {}
+        video_id = data.get('videoId')
+        try: platforms = check_platforms(data.get('platforms')) if data.get('post') else None
+        except ValueError as e: return (json.dumps({"error": str(e)}), 400, headers)
+        video = VIDEOS.approve(video_id) if video_id else None
+        if video:
+            event_log.append('approved', video['client'], video=video_id)
+            EVENTS.publish('approved', video)
+            queued = POST_QUEUE.enqueue(video_id, video['videoUrl'], video['script'], data.get('hashtags', DEFAULT_HASHTAGS), platforms, video['client']) if data.get('post') else 0
+            return (json.dumps({"videoId": video_id, "status": "approved", "postsQueued": queued}), 200, headers)
         return (json.dumps({"error": "Video not found"}), 404, headers)
+    if path.startswith('/stream-audio/'):
+        video_id = path[len('/stream-audio/'):]
+        if not VIDEO_ID_RE.match(video_id): return (json.dumps({"error": "Invalid videoId"}), 400, headers)
+        audio_path, alive = audio_path_for(video_id), None
+        if not os.path.exists(audio_path):
+            # Only wait for audio a running job will actually produce: unknown ids, staged videos without
+            # a file here, and jobs without ElevenLabs or missing this variant get a 404 straight away
+            job = None if VIDEOS.get(video_id) else JOBS.by_video(video_id)
+            if not (job and job['status'] in ('queued', 'running') and ELEVENLABS_API_KEY):
+                return (json.dumps({"error": "No audio for this videoId"}), 404, headers)
+            alive = lambda: (JOBS.get(job['jobId']) or {}).get('status') in ('queued', 'running')
+        return Response(follow_audio(audio_path, timeout=60, alive=alive), 200, headers, mimetype='audio/mpeg')
+    if path == '/daily-report' and request.method == 'POST':
+        # Hit by the 3 AM scheduler; built from the per-day rollups, never from the raw event log
+        data = request.get_json(silent=True) or {}
+        day = data.get('day') or yesterday()
+        if not re.match(r'^\d{4}-\d{2}-\d{2}$', day): return (json.dumps({"error": "day must be YYYY-MM-DD"}), 400, headers)
+        stats = event_log.report_stats(day, data.get('client', '*'))
+        from ara_notifications import ara
+        # Deliver before responding: CPU is throttled once the response is out and atexit never runs on SIGTERM
+        failed_before = ara.dispatcher.failed
+        notification = ara.daily_report(stats)
+        delivered = bool(notification.get('success')) and ara.flush(timeout=30) and ara.dispatcher.failed == failed_before
+        return (json.dumps({"stats": stats, "notification": notification, "delivered": delivered}), 200 if delivered else 502, headers)
+    if path == '/metrics': return Response(render_metrics(), 200, headers, mimetype='text/plain; version=0.0.4')
     if path == '/health': return (json.dumps({"status": "healthy"}), 200, headers)
     return (json.dumps({"error": "Not found"}), 404, headers)
@@ -0,0 +1,116 @@
+"""
+OMMAE Metrics v0.1 - Where did the time go?
+Dependency-free spans, counters and gauges rendered in the Prometheus text format
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [per-bucket counts..., sum, count]
+_counters = {}    # (name, labels) -> value
+_collectors = []  # callables yielding (name, type, labels, value) at scrape time
+_help = {
+    'ommae_span_duration_seconds': ('histogram', 'Duration of instrumented operations by kind and name.'),
+    'ommae_span_errors_total': ('counter', 'Instrumented operations that raised or reported failure.'),
+}
+
+
+def describe(name: str, kind: str, help_text: str):
+    _help[name] = (kind, help_text)
+
+
+def _key(metric: str, labels: Dict) -> Tuple:
+    return metric, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(metric: str, value: float, **labels):
+    key = _key(metric, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+def inc(metric: str, amount: float = 1, **labels):
+    key = _key(metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def register_collector(fn: Callable[[], Iterable[Tuple[str, str, Dict, float]]]):
+    """fn() is called on every scrape and yields (name, 'gauge'|'counter', labels, value)."""
+    _collectors.append(fn)
+
+
+class Span:
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        """Count this span as an error without raising (e.g. a result dict with success=False)."""
+        self.failed = True
+
+
+@contextmanager
+def span(kind: str, name: str):
+    """Time a block as ommae_span_duration_seconds{kind, name}. Works around awaits too."""
+    s, start = Span(), time.perf_counter()
+    try:
+        yield s
+    except BaseException:
+        s.failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('ommae_span_duration_seconds', elapsed, kind=kind, name=name)
+        if s.failed:
+            inc('ommae_span_errors_total', kind=kind, name=name)
+        logger.debug(f"span {kind}/{name} {elapsed * 1000:.1f}ms{' failed' if s.failed else ''}")
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}' if labels else ''
+
+
+def render() -> str:
+    """Everything in the Prometheus text exposition format (0.0.4)."""
+    families = {}
+    with _lock:
+        for (name, labels), h in _histograms.items():
+            rows = families.setdefault(name, [])
+            for bound, count in zip(BUCKETS, h):
+                rows.append((f'{name}_bucket', labels + (('le', f'{bound:g}'),), count))
+            rows.append((f'{name}_bucket', labels + (('le', '+Inf'),), h[-1]))
+            rows.append((f'{name}_sum', labels, round(h[-2], 6)))
+            rows.append((f'{name}_count', labels, h[-1]))
+        for (name, labels), value in _counters.items():
+            families.setdefault(name, []).append((name, labels, value))
+    for collect in _collectors:
+        try:
+            for name, kind, labels, value in collect():
+                _help.setdefault(name, (kind, name.replace('_', ' ')))
+                families.setdefault(name, []).append((name, tuple(sorted(labels.items())), value))
+        except Exception as e:
+            logger.warning(f"metrics collector failed: {e}")
+    lines = []
+    for name in sorted(families):
+        kind, help_text = _help.get(name, ('untyped', name))
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += [f'{sample}{_labels(labels)} {value}' for sample, labels, value in families[name]]
+    return '\n'.join(lines) + '\n'
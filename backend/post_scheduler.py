@@ -0,0 +1,304 @@
+"""
+OMMAE Post Scheduler v0.1 - Saturate the quota, never the 429s
+Persistent per-platform posting queue paced by token buckets
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from video_store import OMMAE_DB_PATH
+from metrics import span
+from event_log import event_log
+from video_renderer import RENDER_DIR
+
+
+def _quota(env: str, default: str):
+    """'<posts>/<seconds>' -> (posts, seconds)."""
+    count, seconds = os.environ.get(env, default).split('/')
+    return int(count), float(seconds)
+
+
+# Documented publish limits: Instagram 50 API posts per rolling 24h, TikTok 6 init calls per minute
+# per token, YouTube 10k quota units per day at 1600 units per videos.insert.
+PLATFORM_QUOTAS = {
+    'instagram': _quota('OMMAE_QUOTA_INSTAGRAM', '50/86400'),
+    'tiktok': _quota('OMMAE_QUOTA_TIKTOK', '6/60'),
+    'youtube': _quota('OMMAE_QUOTA_YOUTUBE', '6/86400'),
+}
+POST_MAX_ATTEMPTS = int(os.environ.get('OMMAE_POST_MAX_ATTEMPTS', '5'))
+POST_RETRY_SECONDS = float(os.environ.get('OMMAE_POST_RETRY_SECONDS', '30'))
+POST_POLL_SECONDS = float(os.environ.get('OMMAE_POST_POLL_SECONDS', '1'))
+
+
+def check_platforms(platforms) -> List[str]:
+    """None means every platform; anything else must be a non-empty list of PLATFORM_QUOTAS keys.
+    Raises ValueError, since a bare string would queue one job per character and an unknown
+    platform would stay pending forever with no worker to drain it."""
+    if platforms is None:
+        return list(PLATFORM_QUOTAS)
+    if not isinstance(platforms, list) or not platforms or \
+            not all(isinstance(p, str) and p in PLATFORM_QUOTAS for p in platforms):
+        raise ValueError(f"platforms must be a non-empty list drawn from {', '.join(PLATFORM_QUOTAS)}")
+    return platforms
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS post_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    hashtags TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    created_at TEXT NOT NULL,
+    client TEXT NOT NULL DEFAULT '',
+    UNIQUE (video_id, platform)
+);
+CREATE INDEX IF NOT EXISTS idx_post_jobs_platform_status ON post_jobs (platform, status, not_before);
+CREATE TABLE IF NOT EXISTS post_buckets (
+    platform TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class TokenBucket:
+    """Refills `capacity` tokens every `period` seconds, one token per upload."""
+
+    def __init__(self, capacity: int, period: float, tokens: Optional[float] = None, updated: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity if tokens is None else tokens
+        self.updated = updated or time.time()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def drain(self):
+        """The platform said 429: assume the window is spent."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class PostQueue:
+    """SQLite-backed job table: one row per (video, platform) so each platform is paced and retried on its own."""
+
+    def __init__(self, path: str = OMMAE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if 'client' not in {row[1] for row in conn.execute('PRAGMA table_info(post_jobs)')}:
+            conn.execute("ALTER TABLE post_jobs ADD COLUMN client TEXT NOT NULL DEFAULT ''")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, video_id: str, video_url: str, caption: str, hashtags: list = None,
+                platforms: List[str] = None, client: str = '') -> int:
+        """Queue a video for every platform. Re-enqueueing an already queued video/platform is a no-op."""
+        created_at = datetime.utcnow().isoformat()
+        rows = [(video_id, p, video_url, caption, json.dumps(hashtags or []), created_at, client)
+                for p in check_platforms(platforms)]
+        cur = self._conn().executemany(
+            'INSERT OR IGNORE INTO post_jobs (video_id, platform, video_url, caption, hashtags, created_at, client) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return cur.rowcount
+
+    def claim(self, platform: str) -> Optional[Dict]:
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute("SELECT * FROM post_jobs WHERE platform = ? AND status = 'pending' AND not_before <= ? "
+                           "ORDER BY id LIMIT 1", (platform, time.time())).fetchone()
+        if row:
+            conn.execute("UPDATE post_jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?", (row['id'],))
+        conn.execute('COMMIT')
+        if not row:
+            return None
+        job = dict(row)
+        job['hashtags'], job['attempts'] = json.loads(job['hashtags']), job['attempts'] + 1
+        return job
+
+    def finish(self, job_id: int, status: str, result: Dict):
+        self._conn().execute('UPDATE post_jobs SET status = ?, result = ? WHERE id = ?',
+                             (status, json.dumps(result), job_id))
+
+    def retry(self, job_id: int, delay: float, result: Dict):
+        self._conn().execute("UPDATE post_jobs SET status = 'pending', not_before = ?, result = ? WHERE id = ?",
+                             (time.time() + delay, json.dumps(result), job_id))
+
+    def recover(self):
+        """Jobs left running by a crashed worker go back to the queue."""
+        self._conn().execute("UPDATE post_jobs SET status = 'pending' WHERE status = 'running'")
+
+    def outstanding(self, platform: str = None, video_id: str = None) -> int:
+        sql, args = "SELECT COUNT(*) FROM post_jobs WHERE status IN ('pending', 'running')", []
+        if platform:
+            sql, args = sql + ' AND platform = ?', args + [platform]
+        if video_id:
+            sql, args = sql + ' AND video_id = ?', args + [video_id]
+        return self._conn().execute(sql, args).fetchone()[0]
+
+    def results(self, video_id: str) -> Dict:
+        rows = self._conn().execute('SELECT platform, status, attempts, result FROM post_jobs WHERE video_id = ?',
+                                    (video_id,)).fetchall()
+        return {r['platform']: {'status': r['status'], 'attempts': r['attempts'],
+                                'result': json.loads(r['result']) if r['result'] else None} for r in rows}
+
+    def stats(self) -> Dict:
+        rows = self._conn().execute('SELECT platform, status, COUNT(*) FROM post_jobs GROUP BY platform, status')
+        stats = {}
+        for platform, status, count in rows:
+            stats.setdefault(platform, {})[status] = count
+        return stats
+
+    def load_bucket(self, platform: str) -> TokenBucket:
+        capacity, period = PLATFORM_QUOTAS[platform]
+        row = self._conn().execute('SELECT tokens, updated FROM post_buckets WHERE platform = ?', (platform,)).fetchone()
+        return TokenBucket(capacity, period, *(tuple(row) if row else ()))
+
+    def save_bucket(self, platform: str, bucket: TokenBucket):
+        self._conn().execute('INSERT OR REPLACE INTO post_buckets (platform, tokens, updated) VALUES (?, ?, ?)',
+                             (platform, bucket.tokens, bucket.updated))
+
+
+class PostScheduler:
+    """One worker per platform drains the queue as fast as that platform's bucket allows.
+    social_poster (and aiohttp) load here, so main.py can enqueue without paying for them."""
+
+    def __init__(self, queue: PostQueue = None):
+        from social_poster import InstagramPoster, TikTokPoster, YouTubePoster
+        self.queue = queue or PostQueue()
+        self.posters = {'instagram': InstagramPoster(), 'tiktok': TikTokPoster(), 'youtube': YouTubePoster()}
+        self._media = {}  # video_id -> [MediaAsset, active uploads], shared by the platforms uploading it right now
+
+    async def run(self, stop_when_idle: bool = True):
+        import aiohttp
+        self.queue.recover()
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_read=60)) as session:
+            await asyncio.gather(*(self._worker(p, session, stop_when_idle) for p in self.posters))
+
+    async def _worker(self, platform: str, session, stop_when_idle: bool):
+        bucket = self.queue.load_bucket(platform)
+        while True:
+            if stop_when_idle and not self.queue.outstanding(platform):
+                return
+            wait = bucket.wait_time()
+            if wait > 0:
+                await asyncio.sleep(min(wait, 60))
+                continue
+            job = self.queue.claim(platform)
+            if not job:
+                await asyncio.sleep(POST_POLL_SECONDS)
+                continue
+            entry = self._media.setdefault(job['video_id'], [self._asset(job['video_url']), 0])
+            entry[1] += 1
+            try:
+                # A token is only spent once the platform API is about to be called
+                result = await self._prepare(platform, entry[0], session)
+                if result is None:
+                    bucket.take()
+                    self.queue.save_bucket(platform, bucket)
+                    result = await self._post(platform, job, entry[0], session)
+            finally:
+                entry[1] -= 1
+            event_log.append('post', job['client'], platform, bool(result.get('success')), video=job['video_id'])
+            if result.get('success'):
+                self.queue.finish(job['id'], 'done', result)
+            elif result.get('permanent'):
+                self.queue.finish(job['id'], 'failed', result)
+            elif result.get('status') == 429:
+                bucket.drain()
+                self.queue.save_bucket(platform, bucket)
+                self.queue.retry(job['id'], bucket.wait_time(), result)
+            elif job['attempts'] < POST_MAX_ATTEMPTS:
+                self.queue.retry(job['id'], POST_RETRY_SECONDS * 2 ** (job['attempts'] - 1), result)
+            else:
+                self.queue.finish(job['id'], 'failed', result)
+            self._release_media(job['video_id'])
+
+    @staticmethod
+    def _asset(url: str):
+        from social_poster import MediaAsset
+        return MediaAsset(url)
+
+    async def _prepare(self, platform: str, media, session) -> Optional[Dict]:
+        """Everything that can fail before the platform is called: None when ready to post, else a failed result.
+        Missing credentials and unusable media are permanent, so they fail at once instead of backing off."""
+        import aiohttp
+        if not self.posters[platform].configured():
+            return {'success': False, 'error': f'{platform} is not configured', 'permanent': True, 'platform': platform}
+        try:
+            await media.ready(session)
+        except (ValueError, aiohttp.InvalidURL) as e:
+            return {'success': False, 'error': f'Unusable media: {e}', 'permanent': True, 'platform': platform}
+        except aiohttp.ClientResponseError as e:
+            return {'success': False, 'error': f'Media download failed: {e.status}', 'permanent': 400 <= e.status < 500,
+                    'platform': platform}
+        except Exception as e:
+            return {'success': False, 'error': f'Media download failed: {e}', 'platform': platform}
+        return None
+
+    async def _post(self, platform: str, job: Dict, media, session) -> Dict:
+        with span('post', platform) as s:
+            try:
+                result = await self.posters[platform].post(media, job['caption'], job['hashtags'], session)
+            except Exception as e:
+                result = {'success': False, 'error': str(e), 'platform': platform}
+            if not result.get('success'):
+                s.fail()
+            return result
+
+    def _release_media(self, video_id: str):
+        """Close the asset once no upload is using it. Platforms posting at the same time share one download,
+        but a video waiting days for its next platform's quota does not keep its temp file until then.
+        A local render is deleted once no platform has a post for it left to make."""
+        entry = self._media.get(video_id)
+        if entry and not entry[1]:
+            entry[0].close()
+            del self._media[video_id]
+            if not self.queue.outstanding(video_id=video_id):
+                self._remove_render(entry[0].url)
+
+    @staticmethod
+    def _remove_render(path: str):
+        """Delete path if it is one of our renders; remote URLs and files outside RENDER_DIR are not ours."""
+        if os.path.realpath(path).startswith(os.path.realpath(RENDER_DIR) + os.sep):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    print("OMMAE Post Scheduler v0.1 - draining the queue")
+    scheduler = PostScheduler()
+    print(json.dumps(scheduler.queue.stats(), indent=2))
+    asyncio.run(scheduler.run())
+    print(json.dumps(scheduler.queue.stats(), indent=2))
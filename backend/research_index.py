@@ -0,0 +1,167 @@
+"""
+OMMAE Research Index v0.1 - Never research the same topic twice in a week
+Near-duplicate topic lookup (MinHash over character shingles, LSH banding) backed by SQLite with a TTL
+"""
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+from video_store import OMMAE_DB_PATH
+from metrics import register_collector
+
+RESEARCH_TTL_SECONDS = float(os.environ.get('OMMAE_RESEARCH_TTL_SECONDS', str(7 * 86400)))
+RESEARCH_SIMILARITY = float(os.environ.get('OMMAE_RESEARCH_SIMILARITY', '0.7'))
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always share a band
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x0A3AE)  # fixed seed: signatures must be stable across processes
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = frozenset('a an and the of for to in on with about our your my is are how why what'.split())
+# Shingles barely see these, but they change what a topic asks: 'top 5' vs 'top 10', 'dosing' vs 'not dosing'
+NEGATIONS = frozenset('no not non never without vs versus'.split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS research_cache (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    normalized TEXT NOT NULL UNIQUE,
+    topic TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    research TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS research_bands (
+    band TEXT NOT NULL,
+    entry INTEGER NOT NULL REFERENCES research_cache (id) ON DELETE CASCADE,
+    PRIMARY KEY (band, entry)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_research_created ON research_cache (created_at);
+"""
+
+
+def _singular(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith('s') and not token.endswith('ss') else token
+
+
+def normalize(topic: str) -> str:
+    """Lowercase, drop punctuation, filler words and plurals, sort tokens:
+    'Wellness, Indigenous!' == 'indigenous wellness'."""
+    tokens = [_singular(t) for t in re.findall(r'[a-z0-9]+', topic.lower())]
+    return ' '.join(sorted(t for t in tokens if t not in STOPWORDS) or tokens)
+
+
+def key_tokens(normalized: str) -> frozenset:
+    """Numbers and negations: topics that differ in any of these are never the same topic."""
+    return frozenset(t for t in normalized.split() if t.isdigit() or t in NEGATIONS)
+
+
+def shingles(normalized: str) -> set:
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(normalized: str) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big') for s in shingles(normalized)]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """MinHash estimate of the Jaccard similarity of the two shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def bands(sig: List[int]) -> List[str]:
+    return [f"{i}:{hashlib.blake2b(repr(sig[i * ROWS:(i + 1) * ROWS]).encode(), digest_size=8).hexdigest()}"
+            for i in range(BANDS)]
+
+
+class ResearchIndex:
+    """Cached research keyed by topic; lookups match near-duplicate topics above a similarity threshold."""
+
+    def __init__(self, path: str = OMMAE_DB_PATH, threshold: float = RESEARCH_SIMILARITY,
+                 ttl: float = RESEARCH_TTL_SECONDS):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, topic: str) -> Optional[Dict]:
+        """Freshest cached research for the closest topic at or above the threshold with the same numbers and
+        negations, or None on a true miss.
+        Returns {'topic', 'research', 'similarity', 'age_seconds'}."""
+        normalized = normalize(topic)
+        sig = signature(normalized)
+        band_keys = bands(sig)
+        rows = self._conn().execute(
+            f"SELECT c.topic, c.normalized, c.signature, c.research, c.created_at FROM research_cache c "
+            f"WHERE c.created_at > ? AND (c.normalized = ? OR c.id IN "
+            f"(SELECT entry FROM research_bands WHERE band IN ({','.join('?' * len(band_keys))})))",
+            (time.time() - self.ttl, normalized, *band_keys)).fetchall()
+        best = None
+        keys = key_tokens(normalized)
+        for cached_topic, cached_normalized, cached_sig, research, created_at in rows:
+            if key_tokens(cached_normalized) != keys:
+                continue
+            score = 1.0 if cached_normalized == normalized else similarity(sig, json.loads(cached_sig))
+            if score >= self.threshold and (best is None or (score, created_at) > best[:2]):
+                best = (score, created_at, cached_topic, research)
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        score, created_at, cached_topic, research = best
+        return {'topic': cached_topic, 'research': json.loads(research), 'similarity': round(score, 3),
+                'age_seconds': round(time.time() - created_at, 1)}
+
+    def store(self, topic: str, research) -> None:
+        """Insert or refresh the research for topic (exact normalized matches are replaced)."""
+        normalized = normalize(topic)
+        sig = signature(normalized)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM research_cache WHERE normalized = ? OR created_at <= ?',
+                         (normalized, time.time() - self.ttl))
+            entry = conn.execute(
+                'INSERT INTO research_cache (normalized, topic, signature, research, created_at) VALUES (?, ?, ?, ?, ?)',
+                (normalized, topic, json.dumps(sig), json.dumps(research), time.time())).lastrowid
+            conn.executemany('INSERT OR IGNORE INTO research_bands (band, entry) VALUES (?, ?)',
+                             [(band, entry) for band in bands(sig)])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def stats(self) -> Dict:
+        entries = self._conn().execute('SELECT COUNT(*) FROM research_cache WHERE created_at > ?',
+                                       (time.time() - self.ttl,)).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {'entries': entries, 'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
+
+
+# Shared instance for video_pipeline.py
+research_index = ResearchIndex()
+register_collector(lambda: [('ommae_research_index_hits_total', 'counter', {}, research_index.hits),
+                            ('ommae_research_index_misses_total', 'counter', {}, research_index.misses)])
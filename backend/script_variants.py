@@ -0,0 +1,53 @@
+"""
+OMMAE Script Variants v0.1 - N hooks, one round trip
+Asks the LLM for several distinct scripts in a single structured request and parses them back out
+"""
+import os
+import re
+import json
+from typing import List
+
+MAX_VARIANTS = int(os.environ.get('OMMAE_MAX_VARIANTS', '5'))
+
+VARIANTS_INSTRUCTION = """Write {n} distinct variants of this script. Each must open with a different hook.
+Return ONLY a JSON array of {n} strings, one script per string, no commentary."""
+
+_NUMBERED = re.compile(r'^\s*(?:variant\s*)?\d+\s*[.):-]\s*', re.IGNORECASE)
+
+
+def variants_prompt(prompt: str, n: int) -> str:
+    """Append the multi-variant instruction to a single-script prompt."""
+    return f"{prompt.rstrip()}\n{VARIANTS_INSTRUCTION.format(n=n)}"
+
+
+def _clean(script: str) -> str:
+    return script.strip().replace('"', '').replace('*', '')
+
+
+def parse_variants(text: str, n: int) -> List[str]:
+    """Up to n distinct, non-empty scripts from an LLM reply.
+
+    Accepts the requested JSON array (also inside a ```json fence or as [{"script": ...}] objects);
+    otherwise falls back to numbered lines or blank-line separated paragraphs."""
+    body = text.strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', body, re.DOTALL)
+    if fenced:
+        body = fenced.group(1).strip()
+    try:
+        if not body.startswith('['):
+            raise ValueError('not a JSON array')  # prose that merely contains brackets, e.g. "[1]"
+        items = json.JSONDecoder().raw_decode(body)[0]  # trailing commentary after the array is ignored
+        if not isinstance(items, list):
+            raise ValueError('expected a JSON array')
+        scripts = [item.get('script', '') if isinstance(item, dict) else str(item) for item in items]
+    except ValueError:
+        numbered = [line for line in body.splitlines() if _NUMBERED.match(line)]
+        if len(numbered) > 1:
+            scripts = [_NUMBERED.sub('', line) for line in numbered]
+        else:
+            scripts = re.split(r'\n\s*\n', body)
+    variants = []
+    for script in map(_clean, scripts):
+        if script and script not in variants:
+            variants.append(script)
+    return variants[:n]
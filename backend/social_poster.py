@@ -5,124 +5,343 @@ One click. Three platforms. Zero fucks given.
 """
 import os
 import json
+import mmap
 import asyncio
+import tempfile
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, Optional
+import aiohttp
 import requests
 
+from metrics import span, register_collector
+from idempotency import SingleFlight, fingerprint
+from event_log import event_log
+
 # Platform API Keys
 INSTAGRAM_ACCESS_TOKEN = os.environ.get('INSTAGRAM_ACCESS_TOKEN', '')
+INSTAGRAM_USER_ID = os.environ.get('INSTAGRAM_USER_ID', 'me')
 TIKTOK_ACCESS_TOKEN = os.environ.get('TIKTOK_ACCESS_TOKEN', '')
+TIKTOK_PRIVACY_LEVEL = os.environ.get('TIKTOK_PRIVACY_LEVEL', 'PUBLIC_TO_EVERYONE')
 YOUTUBE_API_KEY = os.environ.get('YOUTUBE_API_KEY', '')
+YOUTUBE_ACCESS_TOKEN = os.environ.get('YOUTUBE_ACCESS_TOKEN', YOUTUBE_API_KEY)  # uploads need an OAuth token
+
+GRAPH_API = os.environ.get('GRAPH_API_URL', 'https://graph.facebook.com/v19.0')
+TIKTOK_API = os.environ.get('TIKTOK_API_URL', 'https://open.tiktokapis.com/v2')
+YOUTUBE_UPLOAD_API = os.environ.get('YOUTUBE_UPLOAD_URL', 'https://www.googleapis.com/upload/youtube/v3/videos')
+
+UPLOAD_RETRIES = int(os.environ.get('OMMAE_UPLOAD_RETRIES', '3'))
+TIKTOK_CHUNK_SIZE = 10 * 1024 * 1024   # TikTok accepts 5-64 MB chunks, the last one absorbs the remainder
+YOUTUBE_CHUNK_SIZE = 8 * 1024 * 1024   # must be a multiple of 256 KB
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadChunkError(Exception):
+    """A chunk was rejected by the platform and may be retried."""
+
+
+class MediaAsset:
+    """
+    The video, fetched once per post and memory-mapped.
+    Every platform uploads from zero-copy memoryview slices of the same mapping.
+    Loading is lazy, so nothing is downloaded if no platform is configured.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.size = 0
+        self._file = None
+        self._mmap = None
+        self._tmp_path = None
+        self._lock = asyncio.Lock()
+
+    async def ready(self, session: aiohttp.ClientSession) -> 'MediaAsset':
+        async with self._lock:
+            if self._mmap is None:
+                path = self.url if os.path.exists(self.url) else await self._download(session)
+                self._file = open(path, 'rb')
+                self.size = os.fstat(self._file.fileno()).st_size
+                if not self.size:
+                    raise ValueError(f"Empty media: {self.url}")
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    async def _download(self, session: aiohttp.ClientSession) -> str:
+        fd, self._tmp_path = tempfile.mkstemp(suffix='.mp4', prefix='ommae-post-')
+        with os.fdopen(fd, 'wb') as f:
+            async with session.get(self.url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        return self._tmp_path
+
+    def view(self, start: int, end: int) -> memoryview:
+        return memoryview(self._mmap)[start:end]
+
+    def close(self):
+        try:
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass  # a view is still referenced; the mapping is released with it
+        if self._file:
+            self._file.close()
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+
+async def resumable_upload(media: MediaAsset, chunk_size: int,
+                           send_chunk: Callable[[int, int, memoryview], Awaitable[int]],
+                           query_offset: Callable[[], Awaitable[int]] = None, merge_tail: bool = False) -> int:
+    """
+    Upload media in chunks. send_chunk(start, end, view) returns the next offset the server expects.
+    A failed chunk is retried with backoff from the server-acknowledged offset, not from zero.
+    merge_tail folds a short final chunk into the previous one (TikTok's chunking rule).
+    """
+    offset = attempt = 0
+    while offset < media.size:
+        end = min(offset + chunk_size, media.size)
+        if merge_tail and media.size - end < chunk_size:
+            end = media.size
+        try:
+            offset = await send_chunk(offset, end, media.view(offset, end))
+            attempt = 0
+        except (aiohttp.ClientError, asyncio.TimeoutError, UploadChunkError):
+            if attempt == UPLOAD_RETRIES:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            attempt += 1
+            if query_offset:
+                offset = await query_offset()
+    return offset
 
 class SocialPoster:
     """One-click multi-platform posting. POST NOW or cry later."""
     
-    def __init__(self):
+    def __init__(self, session: aiohttp.ClientSession = None):
+        self.session = session
         self.platforms = {
             'instagram': InstagramPoster(),
             'tiktok': TikTokPoster(),
             'youtube': YouTubePoster()
         }
-        self.results = {}
     
-    async def post_all(self, video_url: str, caption: str, hashtags: list = None) -> Dict:
-        """Post to all platforms simultaneously. This is the POST NOW button."""
-        tasks = []
-        for name, poster in self.platforms.items():
-            tasks.append(self._post_to_platform(name, poster, video_url, caption, hashtags))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        success_count = sum(1 for r in results if isinstance(r, dict) and r.get('success'))
+    async def post_all(self, video_url: str, caption: str, hashtags: list = None, client: str = '') -> Dict:
+        """Post to all platforms simultaneously. This is the POST NOW button.
+        The video is fetched once and shared; all uploads go over one pooled HTTP client."""
+        session = self.session or aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_read=60))
+        media = MediaAsset(video_url)
+        try:
+            tasks = []
+            for name, poster in self.platforms.items():
+                tasks.append(self._post_to_platform(name, poster, media, caption, hashtags, session, client))
+            
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            media.close()
+            if session is not self.session:
+                await session.close()
+        # Results are local to this call so overlapping post_all calls never see each other's outcomes
+        results = dict(zip(self.platforms, results))
+        success_count = sum(1 for r in results.values() if r.get('success'))
         
         return {
             'success': success_count > 0,
             'platforms_posted': success_count,
-            'results': self.results,
+            'results': results,
             'message': f'Your empire just creamed on {success_count} platforms. Go make coffee.',
             'timestamp': datetime.now().isoformat()
         }
     
-    async def _post_to_platform(self, name: str, poster, video_url: str, caption: str, hashtags: list):
-        try:
-            result = await poster.post(video_url, caption, hashtags)
-            self.results[name] = result
+    async def _post_to_platform(self, name: str, poster, media: MediaAsset, caption: str, hashtags: list,
+                                session: aiohttp.ClientSession, client: str = ''):
+        with span('post', name) as s:
+            try:
+                result = await poster.post(media, caption, hashtags, session)
+            except Exception as e:
+                result = {'success': False, 'error': str(e), 'platform': name}
+            if not result.get('success'):
+                s.fail()
+            event_log.append('post', client, name, bool(result.get('success')))
             return result
-        except Exception as e:
-            self.results[name] = {'success': False, 'error': str(e)}
-            return self.results[name]
 
 
 class InstagramPoster:
-    """Instagram Reels posting via Graph API."""
+    """Instagram Reels posting via Graph API (resumable upload)."""
     
-    async def post(self, video_url: str, caption: str, hashtags: list = None) -> Dict:
+    def configured(self) -> bool:
+        return bool(INSTAGRAM_ACCESS_TOKEN)
+    
+    async def post(self, media: MediaAsset, caption: str, hashtags: list = None,
+                   session: aiohttp.ClientSession = None) -> Dict:
         if not INSTAGRAM_ACCESS_TOKEN:
-            return {'success': False, 'error': 'No Instagram token', 'platform': 'instagram'}
+            return {'success': False, 'error': 'No Instagram token', 'permanent': True, 'platform': 'instagram'}
         
         full_caption = caption
         if hashtags:
             full_caption += '\n\n' + ' '.join(f'#{tag}' for tag in hashtags)
         
-        # Instagram Graph API for Reels
-        # Step 1: Create media container
-        # Step 2: Publish
+        await media.ready(session)
+        # Step 1: Create a resumable media container
+        params = {'media_type': 'REELS', 'upload_type': 'resumable', 'caption': full_caption[:2200],
+                  'access_token': INSTAGRAM_ACCESS_TOKEN}
+        async with session.post(f"{GRAPH_API}/{INSTAGRAM_USER_ID}/media", params=params) as r:
+            container = await r.json()
+        if 'id' not in container:
+            return {'success': False, 'error': container.get('error', container), 'status': r.status, 'platform': 'instagram'}
+        
+        # Step 2: Upload the bytes to rupload, resuming from `offset` on retry
+        async def send(start, end, view):
+            headers = {'Authorization': f'OAuth {INSTAGRAM_ACCESS_TOKEN}', 'offset': str(start), 'file_size': str(media.size)}
+            async with session.post(container['uri'], data=view, headers=headers) as r:
+                if r.status != 200:
+                    raise UploadChunkError(f"Instagram upload {r.status}: {await r.text()}")
+            return end
+        await resumable_upload(media, media.size, send)
+        
+        # Step 3: Wait for processing, then publish
+        for _ in range(30):
+            async with session.get(f"{GRAPH_API}/{container['id']}",
+                                   params={'fields': 'status_code', 'access_token': INSTAGRAM_ACCESS_TOKEN}) as r:
+                status = (await r.json()).get('status_code')
+            if status in ('FINISHED', 'ERROR'):
+                break
+            await asyncio.sleep(2)
+        async with session.post(f"{GRAPH_API}/{INSTAGRAM_USER_ID}/media_publish",
+                                params={'creation_id': container['id'], 'access_token': INSTAGRAM_ACCESS_TOKEN}) as r:
+            published = await r.json()
+        if 'id' not in published:
+            return {'success': False, 'error': published.get('error', published), 'status': r.status, 'platform': 'instagram'}
         return {
             'success': True,
             'platform': 'instagram',
             'post_type': 'reel',
+            'post_id': published['id'],
+            'bytes_uploaded': media.size,
             'caption': full_caption[:2200],
             'message': 'Posted to Instagram Reels'
         }
 
 
 class TikTokPoster:
-    """TikTok posting via Content Posting API."""
+    """TikTok posting via Content Posting API (chunked FILE_UPLOAD)."""
+    
+    def configured(self) -> bool:
+        return bool(TIKTOK_ACCESS_TOKEN)
     
-    async def post(self, video_url: str, caption: str, hashtags: list = None) -> Dict:
+    async def post(self, media: MediaAsset, caption: str, hashtags: list = None,
+                   session: aiohttp.ClientSession = None) -> Dict:
         if not TIKTOK_ACCESS_TOKEN:
-            return {'success': False, 'error': 'No TikTok token', 'platform': 'tiktok'}
+            return {'success': False, 'error': 'No TikTok token', 'permanent': True, 'platform': 'tiktok'}
         
         full_caption = caption
         if hashtags:
             full_caption += ' ' + ' '.join(f'#{tag}' for tag in hashtags)
         
+        await media.ready(session)
+        chunk_size = min(TIKTOK_CHUNK_SIZE, media.size)
+        headers = {'Authorization': f'Bearer {TIKTOK_ACCESS_TOKEN}', 'Content-Type': 'application/json; charset=UTF-8'}
+        body = {'post_info': {'title': full_caption[:150], 'privacy_level': TIKTOK_PRIVACY_LEVEL},
+                'source_info': {'source': 'FILE_UPLOAD', 'video_size': media.size, 'chunk_size': chunk_size,
+                                'total_chunk_count': max(1, media.size // chunk_size)}}
+        async with session.post(f"{TIKTOK_API}/post/publish/video/init/", json=body, headers=headers) as r:
+            init = await r.json()
+        data = init.get('data') or {}
+        if 'upload_url' not in data:
+            return {'success': False, 'error': init.get('error', init), 'status': r.status, 'platform': 'tiktok'}
+        
+        async def send(start, end, view):
+            headers = {'Content-Type': 'video/mp4', 'Content-Range': f'bytes {start}-{end - 1}/{media.size}'}
+            async with session.put(data['upload_url'], data=view, headers=headers) as r:
+                if r.status not in (200, 201, 206):
+                    raise UploadChunkError(f"TikTok chunk {start}-{end - 1}: {r.status}")
+            return end
+        await resumable_upload(media, chunk_size, send, merge_tail=True)
+        
         return {
             'success': True,
             'platform': 'tiktok',
             'post_type': 'video',
+            'post_id': data.get('publish_id'),
+            'bytes_uploaded': media.size,
             'caption': full_caption[:150],
             'message': 'Posted to TikTok'
         }
 
 
 class YouTubePoster:
-    """YouTube Shorts posting via Data API v3."""
+    """YouTube Shorts posting via Data API v3 (resumable upload)."""
     
-    async def post(self, video_url: str, caption: str, hashtags: list = None) -> Dict:
-        if not YOUTUBE_API_KEY:
-            return {'success': False, 'error': 'No YouTube API key', 'platform': 'youtube'}
+    def configured(self) -> bool:
+        return bool(YOUTUBE_ACCESS_TOKEN)
+    
+    async def post(self, media: MediaAsset, caption: str, hashtags: list = None,
+                   session: aiohttp.ClientSession = None) -> Dict:
+        if not YOUTUBE_ACCESS_TOKEN:
+            return {'success': False, 'error': 'No YouTube API key', 'permanent': True, 'platform': 'youtube'}
         
         title = caption[:100] if len(caption) <= 100 else caption[:97] + '...'
         description = caption
         if hashtags:
             description += '\n\n' + ' '.join(f'#{tag}' for tag in hashtags)
         
+        await media.ready(session)
+        auth = {'Authorization': f'Bearer {YOUTUBE_ACCESS_TOKEN}'}
+        metadata = {'snippet': {'title': title, 'description': description},
+                    'status': {'privacyStatus': 'public', 'selfDeclaredMadeForKids': False}}
+        async with session.post(YOUTUBE_UPLOAD_API, params={'uploadType': 'resumable', 'part': 'snippet,status'},
+                                json=metadata, headers={**auth, 'X-Upload-Content-Length': str(media.size),
+                                                        'X-Upload-Content-Type': 'video/mp4'}) as r:
+            if r.status != 200:
+                return {'success': False, 'error': await r.text(), 'status': r.status, 'platform': 'youtube'}
+            session_uri = r.headers['Location']
+        uploaded = {}
+        
+        async def acknowledged(r):
+            """Next offset from a 308 Range header, or the full size once the video resource comes back."""
+            if r.status in (200, 201):
+                uploaded.update(await r.json())
+                return media.size
+            if r.status == 308:
+                committed = r.headers.get('Range')
+                return int(committed.rsplit('-', 1)[1]) + 1 if committed else 0
+            raise UploadChunkError(f"YouTube upload {r.status}")
+        
+        async def send(start, end, view):
+            headers = {**auth, 'Content-Range': f'bytes {start}-{end - 1}/{media.size}'}
+            async with session.put(session_uri, data=view, headers=headers) as r:
+                return await acknowledged(r)
+        
+        async def query_offset():
+            async with session.put(session_uri, headers={**auth, 'Content-Range': f'bytes */{media.size}'}) as r:
+                return await acknowledged(r)
+        
+        await resumable_upload(media, YOUTUBE_CHUNK_SIZE, send, query_offset)
+        
         return {
             'success': True,
             'platform': 'youtube',
             'post_type': 'short',
+            'post_id': uploaded.get('id'),
+            'bytes_uploaded': media.size,
             'title': title,
             'description': description,
             'message': 'Posted to YouTube Shorts'
         }
 
 
-async def post_now(video_url: str, caption: str, hashtags: list = None) -> Dict:
-    """Main entry point for the POST NOW button."""
-    poster = SocialPoster()
-    return await poster.post_all(video_url, caption, hashtags)
+# POST NOW retries and double clicks share one post. Only a post that reached every platform is replayed:
+# after a partial failure a retry must run again so the failed platforms get another attempt.
+POST_FLIGHTS = SingleFlight(replay_if=lambda result: result['platforms_posted'] == len(result['results']))
+register_collector(lambda: [('ommae_post_now_coalesced_total', 'counter', {}, POST_FLIGHTS.coalesced),
+                            ('ommae_post_now_replayed_total', 'counter', {}, POST_FLIGHTS.replayed)])
+
+
+async def post_now(video_url: str, caption: str, hashtags: list = None, idempotency_key: str = None,
+                   client: str = '') -> Dict:
+    """Main entry point for the POST NOW button.
+    Without an idempotency_key, the same video, caption and hashtags count as the same post."""
+    key = idempotency_key or fingerprint(video_url, caption, hashtags or [])
+    return await POST_FLIGHTS.run_async(key, SocialPoster().post_all, video_url, caption, hashtags, client)
 
 
 if __name__ == "__main__":
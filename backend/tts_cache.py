@@ -0,0 +1,120 @@
+"""
+OMMAE TTS Cache v0.1 - Never pay for the same sentence twice
+Content-addressed on-disk MP3 cache with size-bounded LRU eviction
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+OMMAE_TTS_CACHE_DIR = os.environ.get('OMMAE_TTS_CACHE_DIR', '/tmp/ommae-tts-cache')
+OMMAE_TTS_CACHE_MAX_MB = int(os.environ.get('OMMAE_TTS_CACHE_MAX_MB', '512'))
+
+
+def cache_key(engine: str, voice_id: str, model_id: Optional[str], voice_settings: Optional[Dict], text: str) -> str:
+    """Stable hash of everything that changes the synthesized audio."""
+    blob = json.dumps([engine, voice_id, model_id, voice_settings, text], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """MP3s stored as <dir>/<key>.mp3; least recently used entries are evicted past max_bytes."""
+
+    def __init__(self, directory: str = OMMAE_TTS_CACHE_DIR, max_bytes: int = OMMAE_TTS_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for entry in sorted(os.scandir(directory), key=lambda e: e.stat().st_mtime):
+            if entry.name.endswith('.mp3'):
+                self._entries[entry.name[:-4]] = entry.stat().st_size
+                self._bytes += entry.stat().st_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def fetch(self, key: str, output_path: str) -> Optional[str]:
+        """Copy a cached entry to output_path. Returns output_path on a hit, None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            # Copy via .part so a reader following output_path never sees a half-written file
+            shutil.copyfile(self._path(key), output_path + '.part')
+            os.replace(output_path + '.part', output_path)
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        logger.info(f"TTS cache hit: {key[:12]}")
+        return output_path
+
+    def store(self, key: str, source_path: str):
+        """Atomically add source_path to the cache under key, then evict down to max_bytes."""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out, open(source_path, 'rb') as src:
+                shutil.copyfileobj(src, out)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, self._path(key))
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.stores += 1
+            self._evict()
+
+    def _evict(self):
+        """Caller holds the lock."""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'stores': self.stores, 'evictions': self.evictions,
+                    'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
+
+
+# Shared instance for main.py and audio_generator.py
+tts_cache = TTSCache()
+
+
+def _collect():
+    stats = tts_cache.stats()
+    yield 'ommae_tts_cache_hits_total', 'counter', {}, stats['hits']
+    yield 'ommae_tts_cache_misses_total', 'counter', {}, stats['misses']
+    yield 'ommae_tts_cache_evictions_total', 'counter', {}, stats['evictions']
+    yield 'ommae_tts_cache_bytes', 'gauge', {}, stats['bytes']
+    yield 'ommae_tts_cache_hit_ratio', 'gauge', {}, stats['hit_ratio'] or 0
+
+
+register_collector(_collect)
@@ -0,0 +1,155 @@
+"""
+OMMAE TTS Router v0.1 - Stop knocking on doors that are on fire
+Per-engine health (success rate, p95 latency) with circuit breakers and hard deadlines
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from metrics import span, register_collector
+from event_log import event_log
+
+logger = logging.getLogger(__name__)
+
+TTS_WINDOW_CALLS = int(os.environ.get('OMMAE_TTS_WINDOW_CALLS', '50'))
+TTS_WINDOW_SECONDS = float(os.environ.get('OMMAE_TTS_WINDOW_SECONDS', '300'))
+TTS_FAILURE_RATE = float(os.environ.get('OMMAE_TTS_FAILURE_RATE', '0.5'))
+TTS_MIN_CALLS = int(os.environ.get('OMMAE_TTS_MIN_CALLS', '5'))
+TTS_CONSECUTIVE_FAILURES = int(os.environ.get('OMMAE_TTS_CONSECUTIVE_FAILURES', '3'))
+TTS_COOLDOWN_SECONDS = float(os.environ.get('OMMAE_TTS_COOLDOWN_SECONDS', '30'))
+
+
+class EngineHealth:
+    """Sliding window of recent calls for one engine plus its breaker state (closed / open / half_open)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = deque(maxlen=TTS_WINDOW_CALLS)  # (monotonic time, ok, latency ms)
+        self.state = 'closed'
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.last_error = None
+        self._probing = False
+
+    def _prune(self, now: float):
+        while self.calls and now - self.calls[0][0] > TTS_WINDOW_SECONDS:
+            self.calls.popleft()
+
+    def available(self, now: float) -> bool:
+        return self.state != 'open' or now - self.opened_at >= TTS_COOLDOWN_SECONDS
+
+    def allow(self, now: float) -> bool:
+        """Closed: always. Open: no, until the cooldown ends. Half open: a single probe at a time."""
+        if self.state == 'open':
+            if now - self.opened_at < TTS_COOLDOWN_SECONDS:
+                return False
+            self.state = 'half_open'
+        if self.state == 'half_open':
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record(self, ok: bool, latency_ms: float, now: float, error: Optional[str] = None):
+        self._prune(now)
+        self.calls.append((now, ok, latency_ms))
+        self._probing = False
+        if ok:
+            self.consecutive_failures = 0
+            if self.state == 'half_open':
+                logger.info(f"TTS engine {self.name} recovered, closing circuit")
+                self.state = 'closed'
+            return
+        self.consecutive_failures += 1
+        self.last_error = error
+        if self.state == 'half_open' or self.consecutive_failures >= TTS_CONSECUTIVE_FAILURES or (
+                len(self.calls) >= TTS_MIN_CALLS and self.failure_rate() >= TTS_FAILURE_RATE):
+            if self.state != 'open':
+                logger.warning(f"TTS engine {self.name} circuit opened: {error}")
+            self.state, self.opened_at = 'open', now
+
+    def failure_rate(self) -> float:
+        return sum(1 for _, ok, _ in self.calls if not ok) / len(self.calls) if self.calls else 0.0
+
+    def p95(self) -> Optional[float]:
+        latencies = sorted(ms for _, ok, ms in self.calls if ok)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+
+    def snapshot(self) -> Dict:
+        p95 = self.p95()
+        return {'state': self.state, 'calls': len(self.calls), 'success_rate': round(1 - self.failure_rate(), 3),
+                'p95_ms': round(p95, 1) if p95 is not None else None,
+                'consecutive_failures': self.consecutive_failures, 'last_error': self.last_error}
+
+
+class EngineUnavailable(Exception):
+    """Raised when an engine's circuit is open."""
+
+
+class TTSRouter:
+    """Orders engines fastest-healthy-first and records the outcome of every call."""
+
+    def __init__(self):
+        self.engines = {}
+        self._lock = threading.Lock()
+
+    def _health(self, name: str) -> EngineHealth:
+        if name not in self.engines:
+            self.engines[name] = EngineHealth(name)
+        return self.engines[name]
+
+    def order(self, candidates: List[str], preferred: Optional[str] = None) -> List[str]:
+        """Candidates whose circuit is not open, by p95 latency; untried engines keep their given order.
+        An explicitly preferred engine goes first while it is healthy."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [(i, name, self._health(name)) for i, name in enumerate(candidates)
+                       if self._health(name).available(now)]
+            ranked = sorted(healthy, key=lambda h: (h[1] != preferred, h[2].p95() or 0.0, h[0]))
+        return [name for _, name, _ in ranked]
+
+    def allow(self, name: str) -> bool:
+        with self._lock:
+            return self._health(name).allow(time.monotonic())
+
+    def record(self, name: str, ok: bool, latency_ms: float, error: Optional[str] = None):
+        with self._lock:
+            self._health(name).record(ok, latency_ms, time.monotonic(), error)
+        event_log.append('tts', name=name, ok=ok, ms=round(latency_ms))
+
+    @contextmanager
+    def track(self, name: str):
+        """Record the latency and outcome of a synchronous call; exceptions count as failures."""
+        start = time.monotonic()
+        try:
+            with span('tts', name):
+                yield
+        except Exception as e:
+            self.record(name, False, (time.monotonic() - start) * 1000, f"{type(e).__name__}: {e}")
+            raise
+        self.record(name, True, (time.monotonic() - start) * 1000)
+
+    async def call(self, name: str, factory, timeout: float):
+        """Await factory() under a hard deadline. Raises EngineUnavailable if the circuit is open."""
+        if not self.allow(name):
+            raise EngineUnavailable(f"{name} circuit open")
+        with self.track(name):
+            try:
+                return await asyncio.wait_for(factory(), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{name} exceeded {timeout}s deadline")
+
+    def state(self) -> Dict:
+        with self._lock:
+            return {name: health.snapshot() for name, health in self.engines.items()}
+
+
+# Shared instance for main.py and audio_generator.py
+tts_router = TTSRouter()
+register_collector(lambda: [('ommae_tts_circuit_open', 'gauge', {'engine': name}, int(state['state'] == 'open'))
+                            for name, state in tts_router.state().items()])
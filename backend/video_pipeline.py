@@ -1,59 +1,173 @@
 """
 OMMAE Video Pipeline v0.1 - The heartbeat of content generation
 """
-import os, json, asyncio
+import os, json, uuid, asyncio, weakref
+from contextlib import suppress
 from datetime import datetime
-import anthropic
-import google.generativeai as genai
-import requests
+from functools import lru_cache
+from ffmpeg_pool import ffmpeg_pool, FFmpegError
+from metrics import span
+from script_variants import variants_prompt, parse_variants
+from research_index import research_index
+from event_log import event_log, client_scope
+from audio_generator import generate_audio
+from video_renderer import RENDER_DIR, render_renditions_async, fit_caption
 
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY', '')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT', '')
 KLING_API_KEY = os.environ.get('KLING_API_KEY', '')
+SAMPLE_VIDEO_URL = "https://sample-videos.com/video321/mp4/720/big_buck_bunny_720p_1mb.mp4"
 
-claude_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# anthropic and google.generativeai are imported on first use, not at cold start
+_claude_clients = weakref.WeakKeyDictionary()
+
+def get_claude_client():
+    """One AsyncAnthropic per event loop (its connection pool is bound to the loop), None without a key."""
+    if not ANTHROPIC_API_KEY:
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _claude_clients:
+        import anthropic
+        _claude_clients[loop] = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    return _claude_clients[loop]
+
+@lru_cache(maxsize=None)
+def gemini_model(name='gemini-pro'):
+    import google.generativeai as genai
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=GEMINI_API_KEY, transport='rest', client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+    elif GEMINI_API_KEY:
+        genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(name)
 
 class VideoPipeline:
-    def __init__(self, brand="mohawk_medibles"):
+    def __init__(self, brand="mohawk_medibles", client="mohawkmedibles"):
         self.brand = brand
+        self.client = client  # the client id main.py stages under, so both paths share one rollup
         self.stages = ['research', 'script', 'video', 'process', 'stage']
         
-    async def run(self, topic=None):
-        research = await self.research_topic(topic)
-        script = await self.generate_script(research)
-        video = await self.generate_video(script)
-        processed = await self.process_video(video)
-        return await self.stage_video(processed, script)
+    async def run(self, topic=None, limits=None):
+        with client_scope(self.client):
+            return await self._run(topic, limits)
+    
+    async def _run(self, topic, limits):
+        research = await self._stage('research', limits, self.research_topic, topic)
+        script = await self._stage('script', limits, self.generate_script, research)
+        video = await self._stage('video', limits, self.generate_video, script)
+        processed = await self._stage('process', limits, self.process_video, video)
+        return await self._stage('stage', limits, self.stage_video, processed, script)
+    
+    async def run_variants(self, topic=None, n=3, limits=None):
+        """Research once, write n script variants in a single LLM call, then render and stage each one."""
+        with client_scope(self.client):
+            return await self._run_variants(topic, n, limits)
+    
+    async def _run_variants(self, topic, n, limits):
+        research = await self._stage('research', limits, self.research_topic, topic)
+        scripts = await self._stage('script', limits, self.generate_script_variants, research, n)
+
+        async def finish(script):
+            video = await self._stage('video', limits, self.generate_video, script)
+            processed = await self._stage('process', limits, self.process_video, video)
+            return await self._stage('stage', limits, self.stage_video, processed, script)
+        return await asyncio.gather(*(finish(script) for script in scripts), return_exceptions=True)
+    
+    async def run_many(self, topics, concurrency=4):
+        """Run many topics with the stages pipelined across them.
+        concurrency is an int for every stage or a {stage: limit} dict; results keep topic order,
+        a failed topic yields its exception instead of aborting the batch."""
+        if isinstance(concurrency, int):
+            concurrency = {stage: concurrency for stage in self.stages}
+        limits = {stage: asyncio.Semaphore(concurrency.get(stage, 4)) for stage in self.stages}
+        return await asyncio.gather(*(self.run(topic, limits) for topic in topics), return_exceptions=True)
+    
+    async def _stage(self, name, limits, fn, *args):
+        if not limits:
+            return await self._timed(name, fn, *args)
+        async with limits[name]:
+            return await self._timed(name, fn, *args)
+    
+    async def _timed(self, name, fn, *args):
+        ok = False
+        try:
+            with span('pipeline', name):
+                result = await fn(*args)
+            ok = True
+            return result
+        finally:
+            event_log.append('pipeline', self.client, name, ok)
+    
+    async def _llm(self, prompt):
+        claude_client = get_claude_client()
+        if claude_client:
+            with span('llm', 'claude'):
+                r = await claude_client.messages.create(model="claude-sonnet-4-20250514", max_tokens=1024, messages=[{"role":"user","content":prompt}])
+            return r.content[0].text
+        with span('llm', 'gemini'):
+            return (await gemini_model().generate_content_async(prompt)).text
     
     async def research_topic(self, topic=None):
         if not topic:
             import random
             topic = random.choice(["Indigenous wellness", "Cannabis education", "Behind the scenes"])
+        cached = research_index.lookup(topic)
+        if cached:
+            return {"topic": topic, "research": cached['research']}
         prompt = f"Research for Mohawk Medibles: {topic}. Provide key points, compliance notes, social hook."
-        if claude_client:
-            r = claude_client.messages.create(model="claude-sonnet-4-20250514", max_tokens=1024, messages=[{"role":"user","content":prompt}])
-            return {"topic": topic, "research": r.content[0].text}
-        model = genai.GenerativeModel('gemini-pro')
-        return {"topic": topic, "research": model.generate_content(prompt).text}
+        research = await self._llm(prompt)
+        research_index.store(topic, research)
+        return {"topic": topic, "research": research}
+    
+    def _script_prompt(self, research):
+        return f"Create 15-30s video script for Mohawk Medibles. Research: {json.dumps(research)}"
     
     async def generate_script(self, research):
-        prompt = f"Create 15-30s video script for Mohawk Medibles. Research: {json.dumps(research)}"
-        if claude_client:
-            r = claude_client.messages.create(model="claude-sonnet-4-20250514", max_tokens=1024, messages=[{"role":"user","content":prompt}])
-            return {"script": r.content[0].text}
-        model = genai.GenerativeModel('gemini-pro')
-        return {"script": model.generate_content(prompt).text}
+        return {"script": await self._llm(self._script_prompt(research))}
+    
+    async def generate_script_variants(self, research, n):
+        variants = parse_variants(await self._llm(variants_prompt(self._script_prompt(research), n)), n)
+        return [{"script": script, "variant": i + 1} for i, script in enumerate(variants)]
     
     async def generate_video(self, script):
-        return "https://sample-videos.com/video321/mp4/720/big_buck_bunny_720p_1mb.mp4"
+        """Narrate the script and render every platform rendition ({platform: path}) from one ffmpeg decode.
+        Falls back to the sample URL when rendering is unavailable."""
+        name = f"{self.brand}_{uuid.uuid4().hex[:8]}"
+        audio_path = os.path.join(RENDER_DIR, f"{name}_audio.mp3")
+        try:
+            os.makedirs(RENDER_DIR, exist_ok=True)
+            await generate_audio(script["script"], audio_path)
+            return await render_renditions_async(audio_path, name)
+        except (FFmpegError, OSError) as e:
+            print(f"generate_video error: {e}")
+            return SAMPLE_VIDEO_URL
+        finally:
+            with suppress(FileNotFoundError):
+                os.unlink(audio_path)  # muxed into every rendition; nothing reads it afterwards
     
     async def process_video(self, url):
-        return url
+        """Remux single local files for fast start. Renditions are already muxed that way; they and
+        remote URLs pass through untouched."""
+        if isinstance(url, dict) or not os.path.exists(url):
+            return url
+        processed = f"{os.path.splitext(url)[0]}_processed.mp4"
+        try:
+            await ffmpeg_pool.run_async(['-y', '-i', url, '-c', 'copy', '-movflags', '+faststart', processed], label='remux')
+            return processed
+        except FFmpegError as e:
+            print(f"process_video error: {e}")
+            return url
     
     async def stage_video(self, url, script):
-        return {"video_url": url, "status": "staged", "ready_to_post": True}
+        event_log.append('staged', self.client)
+        if not isinstance(url, dict):
+            return {"video_url": url, "status": "staged", "ready_to_post": True}
+        renditions = {platform: {"video_url": path, "caption": fit_caption(platform, script["script"])}
+                      for platform, path in url.items()}
+        return {"video_url": next(iter(url.values())), "renditions": renditions, "status": "staged", "ready_to_post": True}
 
 async def generate_content(topic=None):
     return await VideoPipeline().run(topic)
+
+async def generate_batch(topics, concurrency=4):
+    return await VideoPipeline().run_many(topics, concurrency)
@@ -0,0 +1,117 @@
+"""
+OMMAE Video Renderer v0.1 - Decode once, deliver everywhere
+Every platform rendition from one ffmpeg run: a split filter graph per encode, a tee muxer per shared encode
+"""
+import os
+import logging
+from typing import Dict, List, Optional
+
+from ffmpeg_pool import ffmpeg_pool
+
+logger = logging.getLogger(__name__)
+
+# Renders stay here until posted: the post scheduler deletes a file once no post job for its video is pending
+RENDER_DIR = os.environ.get('OMMAE_RENDER_DIR', '/tmp/ommae-renders')
+RENDER_PRESET = os.environ.get('OMMAE_RENDER_PRESET', 'veryfast')
+RENDER_BACKGROUND = os.environ.get('OMMAE_RENDER_BACKGROUND', '')  # image or video; brand gradient if unset
+RENDER_TIMEOUT = float(os.environ.get('OMMAE_RENDER_TIMEOUT', '600'))
+PART_SUFFIX = '.part'
+
+# Vertical 9:16 for all three. Renditions with identical encode settings share one encode through the tee muxer.
+RENDITIONS = {
+    'instagram': {'width': 1080, 'height': 1920, 'fps': 30, 'video_bitrate': '5000k', 'audio_bitrate': '128k'},
+    'youtube': {'width': 1080, 'height': 1920, 'fps': 30, 'video_bitrate': '5000k', 'audio_bitrate': '128k'},
+    'tiktok': {'width': 720, 'height': 1280, 'fps': 30, 'video_bitrate': '2500k', 'audio_bitrate': '128k'},
+}
+# Caption/title length each platform accepts, matching what the posters send
+CAPTION_LIMITS = {'instagram': 2200, 'tiktok': 150, 'youtube': 100}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def encode_groups(platforms: List[str]) -> List[Dict]:
+    """Platforms bucketed by identical encode settings: [{'spec': {...}, 'platforms': [...]}, ...]."""
+    groups = {}
+    for platform in platforms:
+        spec = RENDITIONS[platform]
+        groups.setdefault(tuple(sorted(spec.items())), {'spec': spec, 'platforms': []})['platforms'].append(platform)
+    return list(groups.values())
+
+
+def fit_caption(platform: str, caption: str) -> str:
+    limit = CAPTION_LIMITS.get(platform)
+    if not limit or len(caption) <= limit:
+        return caption
+    return caption[:limit - 3].rstrip() + '...'
+
+
+def background_input(width: int, height: int, fps: int, background: str = RENDER_BACKGROUND) -> List[str]:
+    if not background:
+        return ['-f', 'lavfi', '-i', f'gradients=s={width}x{height}:r={fps}:c0=0x0f0f1a:c1=0x1a1a2e:c2=0x00d9a5:'
+                                     f'nb_colors=3:speed=0.002:seed=7']
+    if background.lower().endswith(IMAGE_EXTENSIONS):
+        return ['-loop', '1', '-framerate', str(fps), '-i', background]
+    return ['-stream_loop', '-1', '-i', background]
+
+
+def build_command(audio_path: str, outputs: Dict[str, str], background: str = RENDER_BACKGROUND,
+                  preset: str = RENDER_PRESET) -> List[str]:
+    """ffmpeg arguments rendering outputs ({platform: path}) from one decode of the background and audio.
+
+    The background is scaled to the largest rendition once, split into one branch per distinct encode,
+    and each branch is scaled down as needed. Platforms sharing an encode get it through one tee output."""
+    groups = encode_groups(list(outputs))
+    width = max(g['spec']['width'] for g in groups)
+    height = max(g['spec']['height'] for g in groups)
+    fps = max(g['spec']['fps'] for g in groups)
+    filters = [f"[0:v]scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},"
+               f"fps={fps},format=yuv420p,split={len(groups)}" + ''.join(f'[s{i}]' for i in range(len(groups)))]
+    for i, group in enumerate(groups):
+        spec = group['spec']
+        filters.append(f"[s{i}]scale={spec['width']}:{spec['height']},fps={spec['fps']}[v{i}]")
+    args = ['-y', *background_input(width, height, fps, background), '-i', audio_path,
+            '-filter_complex', ';'.join(filters)]
+    for i, group in enumerate(groups):
+        spec = group['spec']
+        rate = int(spec['video_bitrate'].rstrip('k'))
+        args += ['-map', f'[v{i}]', '-map', '1:a', '-shortest',
+                 '-c:v', 'libx264', '-preset', preset, '-profile:v', 'high', '-pix_fmt', 'yuv420p',
+                 '-b:v', spec['video_bitrate'], '-maxrate', spec['video_bitrate'], '-bufsize', f'{rate * 2}k',
+                 '-g', str(spec['fps'] * 2), '-c:a', 'aac', '-b:a', spec['audio_bitrate'], '-ar', '44100']
+        paths = [outputs[p] + PART_SUFFIX for p in group['platforms']]
+        if len(paths) == 1:
+            args += ['-f', 'mp4', '-movflags', '+faststart', paths[0]]
+        else:
+            # The tee muxer cannot negotiate per-output codec flags, so global headers are set explicitly
+            args += ['-flags', '+global_header', '-f', 'tee',
+                     '|'.join(f'[f=mp4:movflags=+faststart]{path}' for path in paths)]
+    return args
+
+
+def output_paths(name: str, platforms: List[str], render_dir: str = RENDER_DIR) -> Dict[str, str]:
+    return {platform: os.path.join(render_dir, f'{name}_{platform}.mp4') for platform in platforms}
+
+
+def _publish(outputs: Dict[str, str]) -> Dict[str, str]:
+    for path in outputs.values():
+        os.replace(path + PART_SUFFIX, path)
+    return outputs
+
+
+def _discard(outputs: Dict[str, str]):
+    for path in outputs.values():
+        if os.path.exists(path + PART_SUFFIX):
+            os.unlink(path + PART_SUFFIX)
+
+
+async def render_renditions_async(audio_path: str, name: str, platforms: Optional[List[str]] = None,
+                                  background: str = RENDER_BACKGROUND) -> Dict[str, str]:
+    """Render {platform: mp4 path} for the narration at audio_path. Raises FFmpegError on failure."""
+    outputs = output_paths(name, platforms or list(RENDITIONS))
+    os.makedirs(RENDER_DIR, exist_ok=True)
+    try:
+        await ffmpeg_pool.run_async(build_command(audio_path, outputs, background), timeout=RENDER_TIMEOUT,
+                                    label='render')
+    except Exception:
+        _discard(outputs)
+        raise
+    return _publish(outputs)
@@ -0,0 +1,127 @@
+"""
+OMMAE Video Store v0.1 - Staged and approved videos that survive cold starts
+SQLite (WAL) repository, indexed by client/status with cursor pagination and a change version for delta sync
+"""
+import os
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# SQLite needs a local disk with working POSIX locks and a single writing host: run the API and the
+# post scheduler on one VM or container with a persistent disk and point this at it. Network filesystems
+# (gcsfuse, NFS, Filestore) break WAL's shared-memory locking and corrupt the database.
+# /tmp on Cloud Functions / Cloud Run is per-instance memory wiped on every cold start, so there
+# OMMAE_DB_PATH is required and the store refuses to start without it.
+OMMAE_DB_PATH = os.environ.get('OMMAE_DB_PATH', '/tmp/ommae.db')
+ON_SERVERLESS = bool(os.environ.get('K_SERVICE') or os.environ.get('FUNCTION_TARGET'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL UNIQUE,
+    client TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_videos_client_status_seq ON videos (client, status, seq);
+CREATE INDEX IF NOT EXISTS idx_videos_status ON videos (status);
+"""
+
+# Every insert or status change takes the next version, so clients can ask for "everything after N"
+NEXT_VERSION = '(SELECT COALESCE(MAX(version), 0) + 1 FROM videos)'
+
+
+class VideoStore:
+    """Durable video catalog. One connection per thread, WAL so readers never block the writer."""
+
+    def __init__(self, path: str = OMMAE_DB_PATH):
+        self.path = path
+        if ON_SERVERLESS and os.path.abspath(path).startswith('/tmp/'):
+            raise RuntimeError(f"OMMAE_DB_PATH={path} is on the instance's in-memory /tmp: staged and approved videos "
+                               f"would be lost on every cold start. Set OMMAE_DB_PATH to a persistent local disk.")
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if 'version' not in {row[1] for row in conn.execute('PRAGMA table_info(videos)')}:
+            conn.execute('ALTER TABLE videos ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_videos_version ON videos (version)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_videos_client_version ON videos (client, version)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add(self, video: Dict) -> Dict:
+        self._conn().execute(
+            f'INSERT INTO videos (video_id, client, status, created_at, data, version) VALUES (?, ?, ?, ?, ?, {NEXT_VERSION})',
+            (video['videoId'], video['client'], video['status'], video['createdAt'], json.dumps(video)))
+        return video
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        row = self._conn().execute('SELECT data FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def approve(self, video_id: str) -> Optional[Dict]:
+        """Move a staged video to approved. Returns None if it is missing or not staged."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT data FROM videos WHERE video_id = ? AND status = 'staged'",
+                               (video_id,)).fetchone()
+            if not row:
+                conn.execute('ROLLBACK')
+                return None
+            video = json.loads(row[0])
+            video['status'], video['approvedAt'] = 'approved', datetime.utcnow().isoformat()
+            conn.execute(f'UPDATE videos SET status = ?, data = ?, version = {NEXT_VERSION} WHERE video_id = ?',
+                         (video['status'], json.dumps(video), video_id))
+            conn.execute('COMMIT')
+            return video
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def list(self, client: str, status: Optional[str] = 'staged', cursor: Optional[int] = None,
+             limit: int = 50) -> Tuple[List[Dict], Optional[int]]:
+        """One page of a client's videos in creation order. Returns (videos, next_cursor)."""
+        sql, args = 'SELECT seq, data FROM videos WHERE client = ?', [client]
+        if status:
+            sql += ' AND status = ?'
+            args.append(status)
+        if cursor:
+            sql += ' AND seq > ?'
+            args.append(cursor)
+        sql += ' ORDER BY seq LIMIT ?'
+        args.append(limit + 1)
+        rows = self._conn().execute(sql, args).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows[:limit]], next_cursor
+
+    def version(self, client: str) -> int:
+        """Latest change version for a client; 0 if it has no videos."""
+        return self._conn().execute('SELECT COALESCE(MAX(version), 0) FROM videos WHERE client = ?',
+                                    (client,)).fetchone()[0]
+
+    def changes(self, client: str, since: int, limit: int = 200) -> Tuple[List[Dict], int]:
+        """Videos of any status added or changed after version `since`, oldest change first.
+        Returns (videos, cursor); pass cursor back as `since` until fewer than limit come back."""
+        rows = self._conn().execute('SELECT version, data FROM videos WHERE client = ? AND version > ? '
+                                    'ORDER BY version LIMIT ?', (client, since, limit)).fetchall()
+        return [json.loads(data) for _, data in rows], rows[-1][0] if rows else since
+
+    def count(self, status: Optional[str] = None) -> int:
+        if status:
+            return self._conn().execute('SELECT COUNT(*) FROM videos WHERE status = ?', (status,)).fetchone()[0]
+        return self._conn().execute('SELECT COUNT(*) FROM videos').fetchone()[0]
@@ -0,0 +1,301 @@
+"""
+OMMAE Fake Servers v0.1 - Every external API, on localhost, misbehaving on demand
+In-process stand-ins for Gemini, Anthropic, ElevenLabs, Slack, Instagram, TikTok and YouTube
+with configurable latency, error rate and payload size.
+
+    python benchmarks/fake_servers.py --port 8900 --latency-ms 150 --error-rate 0.02
+
+prints the env vars that point the backend at it, then serves until Ctrl-C.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, Optional
+from aiohttp import web
+
+SERVICES = ('gemini', 'anthropic', 'elevenlabs', 'slack', 'instagram', 'tiktok', 'youtube', 'media')
+CHUNK = 16 * 1024
+# One silent MPEG-1 Layer III frame (128 kb/s, 44.1 kHz); repeated, it is a valid MP3 ffmpeg can concat.
+SILENT_MP3_FRAME = bytes.fromhex('fffb9064') + bytes(413)
+VARIANTS_RE = re.compile(r'JSON array of (\d+) strings')
+WORDS = "look here's the thing wellness should be simple real natural mohawk medibles feel better today".split()
+
+
+class FakeServers:
+    """
+    One aiohttp app on a background thread. Defaults apply to every service;
+    overrides={'elevenlabs': {'latency_ms': 900}} tunes one of them.
+    """
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 10, error_rate: float = 0.0,
+                 error_status: int = 500, payload_bytes: int = 256 * 1024, media_bytes: int = 8 * 1024 * 1024,
+                 text_words: int = 60, port: int = 0, overrides: Optional[Dict[str, Dict]] = None):
+        defaults = {'latency_ms': latency_ms, 'jitter_ms': jitter_ms, 'error_rate': error_rate,
+                    'error_status': error_status, 'payload_bytes': payload_bytes}
+        self.profiles = {s: {**defaults, **(overrides or {}).get(s, {})} for s in SERVICES}
+        self.media_bytes = media_bytes
+        self.text_words = text_words
+        self.port = port or _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.requests = Counter()
+        self.errors = Counter()
+        self._media = os.urandom(min(media_bytes, 1024 * 1024))
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> 'FakeServers':
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self._app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            self._loop.run_until_complete(web.TCPSite(self._runner, '127.0.0.1', self.port).start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name='ommae-fake-servers', daemon=True)
+        self._thread.start()
+        ready.wait(10)
+        return self
+
+    def stop(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def env(self) -> Dict[str, str]:
+        """Env vars that point every backend module at this server."""
+        return {
+            'GEMINI_API_KEY': 'fake', 'GEMINI_API_ENDPOINT': self.base_url,
+            'ANTHROPIC_API_KEY': 'fake', 'ANTHROPIC_BASE_URL': self.base_url,
+            'ELEVENLABS_API_KEY': 'fake', 'ELEVENLABS_API_URL': self.base_url,
+            'SLACK_WEBHOOK_URL': f"{self.base_url}/slack/webhook",
+            'INSTAGRAM_ACCESS_TOKEN': 'fake', 'GRAPH_API_URL': f"{self.base_url}/graph",
+            'TIKTOK_ACCESS_TOKEN': 'fake', 'TIKTOK_API_URL': f"{self.base_url}/tiktok",
+            'YOUTUBE_ACCESS_TOKEN': 'fake', 'YOUTUBE_UPLOAD_URL': f"{self.base_url}/youtube/upload",
+            'OMMAE_TTS_ENGINES': 'elevenlabs',  # edge-tts has no local stand-in
+        }
+
+    def media_url(self) -> str:
+        return f"{self.base_url}/media/video.mp4"
+
+    def stats(self) -> Dict:
+        return {s: {'requests': self.requests[s], 'errors': self.errors[s]} for s in SERVICES if self.requests[s]}
+
+    # -- behaviour ---------------------------------------------------------
+
+    async def _behave(self, service: str) -> Optional[web.Response]:
+        """Apply latency; return an error response if this request should fail."""
+        profile = self.profiles[service]
+        self.requests[service] += 1
+        delay = random.gauss(profile['latency_ms'], profile['jitter_ms']) if profile['jitter_ms'] else profile['latency_ms']
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if random.random() < profile['error_rate']:
+            self.errors[service] += 1
+            return web.json_response({'error': {'message': f'fake {service} failure'}}, status=profile['error_status'])
+        return None
+
+    def _text(self) -> str:
+        words = random.choices(WORDS, k=self.text_words)
+        sentences = [' '.join(words[i:i + 8]).capitalize() + '.' for i in range(0, len(words), 8)]
+        return f"{' '.join(sentences)} [{uuid.uuid4().hex[:6]}]"
+
+    def _reply(self, prompt: str) -> str:
+        """Plain text, or a JSON array of scripts when the prompt asks for variants."""
+        match = VARIANTS_RE.search(prompt)
+        return json.dumps([self._text() for _ in range(int(match.group(1)))]) if match else self._text()
+
+    def _app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.add_routes([
+            web.post('/v1beta/models/{model}:generateContent', self.gemini),
+            web.post('/v1/messages', self.anthropic),
+            web.post('/v1/text-to-speech/{voice}/stream', self.elevenlabs),
+            web.post('/v1/text-to-speech/{voice}', self.elevenlabs),
+            web.post('/slack/webhook', self.slack_webhook),
+            web.post('/api/chat.postMessage', self.slack_api),
+            web.get('/media/{name}', self.media),
+            web.post('/graph/{user}/media', self.instagram_container),
+            web.post('/graph/rupload/{container}', self.instagram_upload),
+            web.get('/graph/{container}', self.instagram_status),
+            web.post('/graph/{user}/media_publish', self.instagram_publish),
+            web.post('/tiktok/post/publish/video/init/', self.tiktok_init),
+            web.put('/tiktok/upload/{publish_id}', self.tiktok_upload),
+            web.post('/youtube/upload', self.youtube_init),
+            web.put('/youtube/upload/session/{upload_id}', self.youtube_upload),
+        ])
+        return app
+
+    # -- LLMs --------------------------------------------------------------
+
+    async def gemini(self, request):
+        prompt = await request.text()
+        return await self._behave('gemini') or web.json_response({
+            'candidates': [{'content': {'parts': [{'text': self._reply(prompt)}], 'role': 'model'},
+                            'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {'promptTokenCount': 50, 'candidatesTokenCount': self.text_words,
+                              'totalTokenCount': 50 + self.text_words}})
+
+    async def anthropic(self, request):
+        body = await request.json()
+        return await self._behave('anthropic') or web.json_response({
+            'id': f"msg_{uuid.uuid4().hex[:24]}", 'type': 'message', 'role': 'assistant',
+            'model': body.get('model', 'fake'), 'content': [{'type': 'text', 'text': self._reply(json.dumps(body['messages']))}],
+            'stop_reason': 'end_turn', 'stop_sequence': None,
+            'usage': {'input_tokens': 50, 'output_tokens': self.text_words}})
+
+    # -- TTS ---------------------------------------------------------------
+
+    async def elevenlabs(self, request):
+        await request.read()
+        error = await self._behave('elevenlabs')
+        if error:
+            return error
+        size = self.profiles['elevenlabs']['payload_bytes']
+        payload = SILENT_MP3_FRAME * max(1, size // len(SILENT_MP3_FRAME))
+        response = web.StreamResponse(headers={'Content-Type': 'audio/mpeg'})
+        await response.prepare(request)
+        for i in range(0, len(payload), CHUNK):
+            await response.write(payload[i:i + CHUNK])
+        await response.write_eof()
+        return response
+
+    # -- Slack -------------------------------------------------------------
+
+    async def slack_webhook(self, request):
+        await request.read()
+        return await self._behave('slack') or web.Response(text='ok')
+
+    async def slack_api(self, request):
+        await request.read()
+        return await self._behave('slack') or web.json_response({'ok': True, 'ts': f"{time.time():.6f}"})
+
+    # -- Social ------------------------------------------------------------
+
+    async def media(self, request):
+        error = await self._behave('media')
+        if error:
+            return error
+        response = web.StreamResponse(headers={'Content-Type': 'video/mp4', 'Content-Length': str(self.media_bytes)})
+        await response.prepare(request)
+        sent = 0
+        while sent < self.media_bytes:
+            block = self._media[:self.media_bytes - sent]
+            await response.write(block)
+            sent += len(block)
+        await response.write_eof()
+        return response
+
+    async def instagram_container(self, request):
+        container = uuid.uuid4().hex[:12]
+        return await self._behave('instagram') or web.json_response(
+            {'id': container, 'uri': f"{self.base_url}/graph/rupload/{container}"})
+
+    async def instagram_upload(self, request):
+        await request.read()
+        return await self._behave('instagram') or web.json_response({'success': True})
+
+    async def instagram_status(self, request):
+        return web.json_response({'status_code': 'FINISHED', 'id': request.match_info['container']})
+
+    async def instagram_publish(self, request):
+        return await self._behave('instagram') or web.json_response({'id': uuid.uuid4().hex[:12]})
+
+    async def tiktok_init(self, request):
+        await request.read()
+        publish_id = f"v_pub_{uuid.uuid4().hex[:12]}"
+        return await self._behave('tiktok') or web.json_response({
+            'data': {'publish_id': publish_id, 'upload_url': f"{self.base_url}/tiktok/upload/{publish_id}"},
+            'error': {'code': 'ok', 'message': ''}})
+
+    async def tiktok_upload(self, request):
+        await request.read()
+        error = await self._behave('tiktok')
+        if error:
+            return error
+        end, total = request.headers['Content-Range'].split('-')[1].split('/')
+        return web.Response(status=201 if int(end) + 1 == int(total) else 206)
+
+    async def youtube_init(self, request):
+        await request.read()
+        upload_id = uuid.uuid4().hex[:12]
+        return await self._behave('youtube') or web.Response(
+            headers={'Location': f"{self.base_url}/youtube/upload/session/{upload_id}"})
+
+    async def youtube_upload(self, request):
+        await request.read()
+        content_range = request.headers['Content-Range']
+        if content_range.startswith('bytes */'):
+            return web.Response(status=308)  # the fake does not remember partial uploads
+        error = await self._behave('youtube')
+        if error:
+            return error
+        end, total = content_range.split(' ')[1].split('-')[1].split('/')
+        if int(end) + 1 == int(total):
+            return web.json_response({'id': request.match_info['upload_id'], 'kind': 'youtube#video'})
+        return web.Response(status=308, headers={'Range': f"bytes=0-{end}"})
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--payload-kb', type=int, default=256, help='TTS response size')
+    parser.add_argument('--media-mb', type=float, default=8, help='video size served to the posters')
+    parser.add_argument('--override', action='append', default=[], metavar='SERVICE:KEY=VALUE',
+                        help='per-service setting, e.g. elevenlabs:latency_ms=900')
+
+
+def from_arguments(args, port: int = 0) -> FakeServers:
+    overrides = {}
+    for item in args.override:
+        service, setting = item.split(':', 1)
+        key, value = setting.split('=', 1)
+        overrides.setdefault(service, {})[key] = float(value)
+    return FakeServers(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                       error_status=args.error_status, payload_bytes=args.payload_kb * 1024,
+                       media_bytes=int(args.media_mb * 1024 * 1024), port=port, overrides=overrides)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    servers = from_arguments(args, args.port).start()
+    for key, value in servers.env().items():
+        print(f"export {key}={value}")
+    print(f"# media: {servers.media_url()}")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(servers.stats()))
+    except KeyboardInterrupt:
+        servers.stop()
@@ -0,0 +1,179 @@
+"""
+OMMAE Load Benchmark v0.1 - Throughput and tail latency, fully offline
+Drives the backend against benchmarks/fake_servers.py at a configurable concurrency.
+
+    python benchmarks/load.py --scenario all --requests 200 --concurrency 16 --latency-ms 150
+
+Scenarios:
+    generate   main() POST /generate-video, then /job-status until the job finishes
+    pipeline   VideoPipeline.run
+    audio      audio_generator.generate_audio
+    post       SocialPoster.post_all
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+warnings.filterwarnings('ignore')
+
+from fake_servers import add_arguments, from_arguments
+
+SCENARIOS = ('generate', 'pipeline', 'audio', 'post')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))]
+
+
+def summarize(name, samples, wall_s, concurrency):
+    ok = sorted(ms for success, ms in samples if success)
+    return {
+        'scenario': name, 'requests': len(samples), 'concurrency': concurrency, 'errors': len(samples) - len(ok),
+        'wall_s': round(wall_s, 3), 'throughput_rps': round(len(samples) / wall_s, 2) if wall_s else None,
+        'p50_ms': _round(percentile(ok, 50)), 'p95_ms': _round(percentile(ok, 95)),
+        'p99_ms': _round(percentile(ok, 99)), 'max_ms': _round(ok[-1] if ok else None),
+    }
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def run_threads(op, requests, concurrency):
+    """Blocking op(i) -> bool on a thread pool. Returns ([(ok, ms)], wall seconds)."""
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = op(i)
+        except Exception:
+            ok = False
+        return ok, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    return samples, time.perf_counter() - start
+
+
+def run_async(op, requests, concurrency):
+    """Coroutine op(i) -> bool with at most `concurrency` in flight."""
+    async def drive():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def timed(i):
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    ok = await op(i)
+                except Exception:
+                    ok = False
+                return ok, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(timed(i) for i in range(requests)))
+        return samples, time.perf_counter() - start
+
+    return asyncio.run(drive())
+
+
+def scenario_generate(fake, tmp):
+    import main
+    from flask import Flask
+    app = Flask('bench')
+
+    def hit(path, method='GET', body=None, query=None):
+        with app.test_request_context(path, method=method, json=body, query_string=query):
+            from flask import request
+            return main.main(request)
+
+    def op(i):
+        body, status, _ = hit('/generate-video', 'POST', {'client': 'bench', 'topic': f'load test {i}'})
+        if status != 202:
+            return False
+        job_id = json.loads(body)['jobId']
+        while True:
+            job = json.loads(hit('/job-status', query={'jobId': job_id})[0])
+            if job['status'] not in ('queued', 'running'):
+                return job['status'] == 'done' and job['video']['realGeneration']
+            time.sleep(0.005)
+    return op, run_threads
+
+
+def scenario_pipeline(fake, tmp):
+    from video_pipeline import VideoPipeline
+    pipeline = VideoPipeline()
+
+    async def op(i):
+        return (await pipeline.run(f'load test {uuid.uuid4().hex}'))['status'] == 'staged'
+    return op, run_async
+
+
+def scenario_audio(fake, tmp):
+    from audio_generator import generate_audio
+
+    async def op(i):
+        path = os.path.join(tmp, f'audio_{i}.mp3')
+        await generate_audio(f'Look. Here is load test number {i}. Real wellness. {uuid.uuid4().hex}', path, chunked=False)
+        ok = os.path.getsize(path) > 0
+        os.unlink(path)
+        return ok
+    return op, run_async
+
+
+def scenario_post(fake, tmp):
+    from social_poster import SocialPoster
+
+    async def op(i):
+        result = await SocialPoster().post_all(fake.media_url(), f'Load test {i}', ['bench'])
+        return result['platforms_posted'] == 3
+    return op, run_async
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, from_arguments(args) as fake:
+        # Modules read their configuration at import time, so point them at the fakes first.
+        os.environ.update(fake.env())
+        os.environ.update(OMMAE_DB_PATH=os.path.join(tmp, 'ommae.db'), OMMAE_TTS_CACHE_DIR=os.path.join(tmp, 'tts'),
+                          OMMAE_AMBIENT_DIR=os.path.join(tmp, 'ambient'), OMMAE_EVENT_LOG_DIR=os.path.join(tmp, 'events'),
+                          OMMAE_RENDER_DIR=os.path.join(tmp, 'renders'))
+        results = []
+        for name in (SCENARIOS if args.scenario == 'all' else (args.scenario,)):
+            op, runner = globals()[f'scenario_{name}'](fake, tmp)
+            samples, wall_s = runner(op, args.requests, args.concurrency)
+            results.append(summarize(name, samples, wall_s, args.concurrency))
+        calls = fake.stats()
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        print(json.dumps({'fake_server_calls': calls}))
+        return
+    print(f"{'scenario':<10} {'reqs':>6} {'conc':>5} {'errors':>6} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['requests']:>6} {r['concurrency']:>5} {r['errors']:>6} {r['throughput_rps']:>9} "
+              f"{str(r['p50_ms']):>9} {str(r['p95_ms']):>9} {str(r['p99_ms']):>9} {str(r['max_ms']):>9}")
+    print(f"\nfake server calls: {json.dumps(calls)}")
+
+
+if __name__ == '__main__':
+    main()
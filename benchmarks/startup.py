@@ -0,0 +1,110 @@
+"""
+OMMAE Startup Benchmark v0.1 - How cold is a cold start?
+Measures `import main` with python -X importtime and the cost of the first requests.
+
+    python benchmarks/startup.py [--runs 5] [--top 15] [--max-import-ms 400]
+
+Exits non-zero when the median import time exceeds --max-import-ms, so CI can catch regressions.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)')
+
+# Runs in a fresh interpreter: time the import, then the first and second hit of each route.
+FIRST_REQUEST = r"""
+import sys, json, time, warnings
+warnings.filterwarnings('ignore')
+t0 = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - t0) * 1000
+from flask import Flask
+app = Flask('bench')
+
+def hit(path, method='GET', body=None, query=None):
+    t = time.perf_counter()
+    with app.test_request_context(path, method=method, json=body, query_string=query):
+        from flask import request
+        response = main.main(request)
+    return (time.perf_counter() - t) * 1000, response
+
+timings = {'import_ms': import_ms}
+for label in ('first', 'second'):
+    timings[f'status_{label}_ms'], _ = hit('/')
+    ms, response = hit('/generate-video', 'POST', {'topic': 'cold start'})
+    job_id = json.loads(response[0])['jobId']
+    t = time.perf_counter()
+    while json.loads(hit('/job-status', query={'jobId': job_id})[1][0])['status'] in ('queued', 'running'):
+        time.sleep(0.001)
+    timings[f'generate_{label}_ms'] = ms + (time.perf_counter() - t) * 1000
+print(json.dumps(timings))
+"""
+
+
+def isolated_env(tmp):
+    """No API keys (so nothing leaves the machine) and scratch state under tmp."""
+    env = {k: v for k, v in os.environ.items() if not k.endswith(('_API_KEY', '_TOKEN', '_WEBHOOK_URL'))}
+    env.update(OMMAE_DB_PATH=os.path.join(tmp, 'ommae.db'), OMMAE_TTS_CACHE_DIR=os.path.join(tmp, 'tts'),
+               OMMAE_AMBIENT_DIR=os.path.join(tmp, 'ambient'), OMMAE_EVENT_LOG_DIR=os.path.join(tmp, 'events'),
+               OMMAE_RENDER_DIR=os.path.join(tmp, 'renders'), PYTHONDONTWRITEBYTECODE='1')
+    return env
+
+
+def import_profile(env):
+    """[(cumulative_us, module)] for the modules `import main` pulls in directly."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and len(match.group(3)) == 3:
+            rows.append((int(match.group(2)), match.group(4)))
+    return sorted(rows, reverse=True)
+
+
+def first_requests(env):
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = isolated_env(tmp)
+        profile = import_profile(env)
+        runs = [first_requests(env) for _ in range(args.runs)]
+
+    summary = {key: round(statistics.median(r[key] for r in runs), 1) for key in runs[0]}
+    summary['top_imports_ms'] = {module: round(us / 1000, 1) for us, module in profile[:args.top]}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Startup benchmark (median of {args.runs} cold interpreters)")
+        for key, value in summary.items():
+            if key != 'top_imports_ms':
+                print(f"  {key:<22} {value:>9.1f}")
+        print(f"\nSlowest imports under main (cumulative ms, -X importtime)")
+        for module, ms in summary['top_imports_ms'].items():
+            print(f"  {module:<40} {ms:>9.1f}")
+
+    if args.max_import_ms is not None and summary['import_ms'] > args.max_import_ms:
+        print(f"\nREGRESSION: import main took {summary['import_ms']} ms (budget {args.max_import_ms} ms)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Backend modules import each other by bare name and read their paths from the environment at import time
+_tmp = tempfile.mkdtemp(prefix='ommae-tests-')
+for var, sub in (('OMMAE_DB_PATH', 'ommae.db'), ('OMMAE_EVENT_LOG_DIR', 'events'), ('OMMAE_TTS_CACHE_DIR', 'tts-cache'),
+                 ('OMMAE_AMBIENT_DIR', 'ambient'), ('OMMAE_RENDER_DIR', 'renders')):
+    os.environ[var] = os.path.join(_tmp, sub)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
@@ -0,0 +1,50 @@
+from event_log import EventLog
+
+
+def test_two_writers_on_one_directory_keep_every_event(tmp_path):
+    api, scheduler = EventLog(str(tmp_path)), EventLog(str(tmp_path))
+    for _ in range(6):
+        api.append('staged', 'acme')
+    for platform in ('instagram', 'tiktok', 'youtube'):
+        scheduler.append('post', 'acme', platform)
+    api.flush()
+    scheduler.flush()
+    assert api.slot != scheduler.slot
+
+    reader = EventLog(str(tmp_path))
+    assert reader.rollup(client='acme') == {'staged': 6, 'post': 3, 'post:instagram': 1,
+                                            'post:tiktok': 1, 'post:youtube': 1}
+    assert len(list(reader.replay())) == 9
+    assert reader.report_stats(client='acme')['platform_posts'] == 3
+
+
+def test_unflushed_tail_is_counted_after_restart(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append('approved', 'acme')
+    log.append('post', 'acme', 'tiktok', ok=False)
+    log._file.close()  # crash: no checkpoint since the first append
+    log._slot_lock.close()
+
+    stats = EventLog(str(tmp_path)).report_stats(client='acme')
+    assert stats['approved'] == 1 and stats['posts_failed'] == 1 and stats['platform_posts'] == 0
+
+
+def test_rotation_keeps_rollups(tmp_path, monkeypatch):
+    import event_log
+    monkeypatch.setattr(event_log, 'SEGMENT_BYTES', 200)
+    monkeypatch.setattr(event_log, 'MAX_SEGMENTS', 2)
+    log = EventLog(str(tmp_path))
+    for _ in range(20):
+        log.append('staged', 'acme')
+    assert len(event_log.segments(log.directory)) == 2
+    assert EventLog(str(tmp_path)).rollup(client='acme') == {'staged': 20}
+
+
+def test_client_scope_tags_events_recorded_without_a_client(tmp_path):
+    from event_log import client_scope
+    log = EventLog(str(tmp_path))
+    with client_scope('acme'):
+        log.append('tts', name='edge-tts')
+    log.append('tts', name='edge-tts')
+    assert log.rollup(client='acme') == {'tts': 1, 'tts:edge-tts': 1}
+    assert log.rollup()['tts'] == 2
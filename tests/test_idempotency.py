@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from idempotency import SingleFlight, fingerprint
+
+
+def test_concurrent_callers_attach_to_the_call_in_flight():
+    flights, started, release = SingleFlight(), threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'posted'
+    first = threading.Thread(target=lambda: results.append(flights.run('k', work)))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.append(flights.run('k', work)))
+    second.start()
+    while not flights.coalesced:
+        time.sleep(0.001)
+    release.set()
+    first.join()
+    second.join()
+    assert results == ['posted', 'posted'] and len(calls) == 1
+    assert flights.stats()['calls'] == 1 and flights.stats()['coalesced'] == 1
+
+
+def test_results_replay_only_within_ttl_and_when_accepted():
+    flights = SingleFlight(ttl=0.05, replay_if=lambda result: result != 'partial')
+    calls = []
+    assert flights.run('k', lambda: calls.append(1) or 'ok') == 'ok'
+    assert flights.run('k', lambda: calls.append(1) or 'ok') == 'ok'
+    assert len(calls) == 1 and flights.replayed == 1
+    time.sleep(0.06)
+    flights.run('k', lambda: calls.append(1) or 'ok')
+    assert len(calls) == 2
+
+    flights.run('p', lambda: calls.append(1) or 'partial')
+    flights.run('p', lambda: calls.append(1) or 'partial')
+    assert len(calls) == 4
+
+
+def test_failures_are_not_replayed():
+    flights = SingleFlight()
+
+    async def fail():
+        raise RuntimeError('platform down')
+
+    async def succeed():
+        return 'ok'
+    with pytest.raises(RuntimeError):
+        asyncio.run(flights.run_async('k', fail))
+    assert asyncio.run(flights.run_async('k', succeed)) == 'ok'
+    assert flights.stats() == {'in_flight': 0, 'replayable': 1, 'calls': 2, 'coalesced': 0, 'replayed': 0}
+
+
+def test_oldest_results_are_evicted_past_max_keys():
+    flights, calls = SingleFlight(max_keys=2), []
+    for key in ('a', 'b', 'c', 'a'):
+        flights.run(key, lambda: calls.append(1) or 'ok')
+    assert len(calls) == 4 and flights.stats()['replayable'] == 2
+
+
+def test_fingerprint_is_stable_and_order_sensitive():
+    assert fingerprint('generate-video', 'acme', 'edibles', 1) == fingerprint('generate-video', 'acme', 'edibles', 1)
+    assert fingerprint('generate-video', 'acme', 'edibles', 1) != fingerprint('generate-video', 'acme', 'edibles', 2)
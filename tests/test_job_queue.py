@@ -0,0 +1,84 @@
+import time
+import threading
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, KeyConflict
+
+
+def test_serverless_requires_background_cpu(monkeypatch):
+    monkeypatch.setattr(job_queue, 'ON_SERVERLESS', True)
+    monkeypatch.setattr(job_queue, 'BACKGROUND_CPU', False)
+    with pytest.raises(RuntimeError, match='OMMAE_BACKGROUND_CPU'):
+        JobQueue()
+    monkeypatch.setattr(job_queue, 'BACKGROUND_CPU', True)
+    JobQueue().shutdown()
+
+
+def test_finished_totals_survive_eviction():
+    queue = JobQueue(workers=1, history=2)
+
+    def fail():
+        raise ValueError('boom')
+    for fn in (lambda: 1, fail, lambda: 3, lambda: 4):
+        job = queue.submit(fn)
+        while queue.get(job['jobId'])['status'] in ('queued', 'running'):
+            time.sleep(0.001)
+    queue.shutdown()
+    stats = queue.stats()
+    assert stats['done'] + stats['failed'] == 2
+    assert stats['finished'] == {'done': 3, 'failed': 1}
+
+
+def wait(queue, job):
+    while queue.get(job['jobId'])['status'] in ('queued', 'running'):
+        time.sleep(0.001)
+
+
+def test_submit_once_attaches_while_running_and_replays_within_window():
+    queue, release = JobQueue(workers=1), threading.Event()
+    first, created = queue.submit_once('k', 'topic-a', 60, {'videoIds': ['v1']}, release.wait)
+    again, attached = queue.submit_once('k', 'topic-a', 60, {'videoIds': ['v2']}, release.wait)
+    assert created and not attached and again['jobId'] == first['jobId'] and again['videoIds'] == ['v1']
+    release.set()
+    wait(queue, first)
+    assert queue.submit_once('k', 'topic-a', 60, None, release.wait)[0]['jobId'] == first['jobId']
+    assert queue.stats()['attached'] == 2
+    queue.shutdown()
+
+
+def test_submit_once_rejects_a_live_key_reused_for_another_request():
+    queue, release = JobQueue(workers=1), threading.Event()
+    queue.submit_once('k', 'topic-a', 60, None, release.wait)
+    with pytest.raises(KeyConflict):
+        queue.submit_once('k', 'topic-b', 60, None, release.wait)
+    release.set()
+    queue.shutdown()
+
+
+def test_submit_once_never_replays_failures_or_expired_windows():
+    queue = JobQueue(workers=1)
+
+    def fail():
+        raise ValueError('boom')
+    failed, _ = queue.submit_once('bad', 'r', 60, None, fail)
+    wait(queue, failed)
+    retried, created = queue.submit_once('bad', 'other', 60, None, lambda: 1)
+    assert created and retried['jobId'] != failed['jobId']
+
+    done, _ = queue.submit_once('fp', 'fp', 0, None, lambda: 1)
+    wait(queue, done)
+    assert queue.submit_once('fp', 'fp', 0, None, lambda: 1)[1]
+    queue.shutdown()
+
+
+def test_evicted_jobs_release_their_keys():
+    queue = JobQueue(workers=1, history=1)
+    first, _ = queue.submit_once('k', 'r', 60, None, lambda: 1)
+    wait(queue, first)
+    second, _ = queue.submit_once('other', 'r', 60, None, lambda: 2)
+    wait(queue, second)
+    assert queue.get(first['jobId']) is None and 'k' not in queue.keys
+    assert queue.submit_once('k', 'r', 60, None, lambda: 1)[1]
+    queue.shutdown()
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from post_scheduler import PostQueue, check_platforms
+
+
+@pytest.mark.parametrize('platforms', ['youtube', ['facebook'], [], ['tiktok', 3]])
+def test_enqueue_rejects_anything_but_known_platforms(tmp_path, platforms):
+    queue = PostQueue(str(tmp_path / 'ommae.db'))
+    with pytest.raises(ValueError):
+        queue.enqueue('video-1', 'u', 'caption', [], platforms)
+    assert queue.stats() == {}
+
+
+def test_enqueue_defaults_to_every_platform(tmp_path):
+    queue = PostQueue(str(tmp_path / 'ommae.db'))
+    assert queue.enqueue('video-1', 'u', 'caption', [], None, 'acme') == 3
+    assert check_platforms(['youtube']) == ['youtube']
+    assert queue.claim('youtube')['client'] == 'acme'
+
+
+class FakePoster:
+    def __init__(self, configured=True, result=None):
+        self.calls = 0
+        self._configured = configured
+        self.result = result or {'success': False, 'error': 'HTTP 500', 'status': 500}
+
+    def configured(self):
+        return self._configured
+
+    async def post(self, media, caption, hashtags, session):
+        self.calls += 1
+        return self.result
+
+
+def run_scheduler(tmp_path, poster, video_url):
+    import asyncio
+    pytest.importorskip('aiohttp')
+    from post_scheduler import PostScheduler
+    queue = PostQueue(str(tmp_path / 'ommae.db'))
+    queue.enqueue('video-1', video_url, 'caption', [], ['youtube'], 'acme')
+    scheduler = PostScheduler(queue)
+    scheduler.posters = {'youtube': poster}
+    asyncio.run(scheduler.run())
+    return queue, queue.load_bucket('youtube')
+
+
+def test_unconfigured_platform_fails_at_once_without_spending_tokens(tmp_path):
+    poster = FakePoster(configured=False)
+    queue, bucket = run_scheduler(tmp_path, poster, str(tmp_path / 'missing.mp4'))
+    assert queue.results('video-1')['youtube']['status'] == 'failed'
+    assert queue.results('video-1')['youtube']['attempts'] == 1
+    assert poster.calls == 0 and bucket.tokens >= bucket.capacity - 0.01
+
+
+def test_unusable_media_fails_without_spending_tokens(tmp_path):
+    empty = tmp_path / 'empty.mp4'
+    empty.write_bytes(b'')
+    poster = FakePoster()
+    queue, bucket = run_scheduler(tmp_path, poster, str(empty))
+    assert queue.results('video-1')['youtube']['status'] == 'failed'
+    assert poster.calls == 0 and bucket.tokens >= bucket.capacity - 0.01
+
+
+def test_posted_render_is_deleted_but_other_media_is_kept(tmp_path):
+    from video_renderer import RENDER_DIR
+    os.makedirs(RENDER_DIR, exist_ok=True)
+    render, upload = os.path.join(RENDER_DIR, 'brand_1_youtube.mp4'), tmp_path / 'upload.mp4'
+    for path in (render, upload):
+        with open(path, 'wb') as f:
+            f.write(b'video')
+        db_dir = tmp_path / os.path.basename(path).replace('.', '_')
+        db_dir.mkdir()
+        poster = FakePoster(result={'success': True})
+        queue, _ = run_scheduler(db_dir, poster, str(path))
+        assert poster.calls == 1 and queue.results('video-1')['youtube']['status'] == 'done'
+    assert not os.path.exists(render) and upload.exists()
@@ -0,0 +1,31 @@
+import pytest
+
+from research_index import ResearchIndex, normalize
+
+
+def test_normalize_ignores_case_punctuation_filler_and_plurals():
+    assert normalize('Wellness, Indigenous!') == normalize('indigenous wellness')
+    assert normalize('The benefits of Edibles') == normalize('edible benefit')
+    assert normalize('Top 5 strains') != normalize('Top 10 strains')
+
+
+@pytest.mark.parametrize('cached, asked', [
+    ('Top 5 strains', 'Top 10 strains'),
+    ('edibles dosing', 'edibles not dosing'),
+    ('load test 1', 'load test 2'),
+    ('CBD with THC', 'CBD without THC'),
+])
+def test_numbers_and_negations_keep_topics_apart(tmp_path, cached, asked):
+    index = ResearchIndex(str(tmp_path / 'ommae.db'))
+    index.store(cached, {'notes': cached})
+    assert index.lookup(asked) is None
+
+
+def test_near_duplicates_share_research(tmp_path):
+    index = ResearchIndex(str(tmp_path / 'ommae.db'))
+    index.store('Indigenous wellness traditions', {'notes': 'x'})
+    hit = index.lookup('indigenous wellness tradition!')
+    assert hit['research'] == {'notes': 'x'} and hit['similarity'] == 1.0
+    hit = index.lookup('indigenous wellnes traditions')
+    assert hit is not None and hit['similarity'] >= index.threshold
+    assert index.lookup('cannabis tea recipes') is None
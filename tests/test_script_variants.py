@@ -0,0 +1,18 @@
+from script_variants import parse_variants
+
+
+def test_json_array_inside_fence():
+    assert parse_variants('Sure!\n```json\n["Look. One.", {"script": "Two."}]\n```', 3) == ['Look. One.', 'Two.']
+
+
+def test_numbered_prose_with_brackets_is_not_json():
+    reply = '1. Look, 3 tips [1] for you.\n2. I get it. Second hook.'
+    assert parse_variants(reply, 3) == ['Look, 3 tips [1] for you.', 'I get it. Second hook.']
+
+
+def test_paragraph_fallback_dedupes_and_caps():
+    assert parse_variants('First hook.\n\nFirst hook.\n\nSecond hook.\n\nThird.', 2) == ['First hook.', 'Second hook.']
+
+
+def test_commentary_after_the_array_is_ignored():
+    assert parse_variants('["One.", "Two."]\nHope these help!', 2) == ['One.', 'Two.']
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import audio_generator
+import tts_router as router_module
+from tts_router import EngineHealth, EngineUnavailable, TTSRouter
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once(monkeypatch):
+    monkeypatch.setattr(router_module, 'TTS_COOLDOWN_SECONDS', 10)
+    health = EngineHealth('elevenlabs')
+    for t in range(router_module.TTS_CONSECUTIVE_FAILURES):
+        assert health.allow(t)
+        health.record(False, 100, t, 'boom')
+    assert health.state == 'open'
+    assert not health.allow(5)
+    assert health.allow(20) and health.state == 'half_open'
+    assert not health.allow(20.1)  # one probe at a time
+    health.record(True, 100, 21)
+    assert health.state == 'closed'
+
+
+def test_failed_probe_reopens():
+    health = EngineHealth('edge-tts')
+    health.state, health.opened_at = 'open', 0
+    assert health.allow(router_module.TTS_COOLDOWN_SECONDS + 1)
+    health.record(False, 50, router_module.TTS_COOLDOWN_SECONDS + 2)
+    assert health.state == 'open'
+
+
+def test_order_prefers_fast_healthy_engines():
+    router = TTSRouter()
+    router.record('slow', True, 900)
+    router.record('fast', True, 100)
+    assert router.order(['slow', 'fast', 'untried']) == ['untried', 'fast', 'slow']
+    assert router.order(['slow', 'fast'], preferred='slow') == ['slow', 'fast']
+    router.engines['fast'].state, router.engines['fast'].opened_at = 'open', time.monotonic()
+    assert router.order(['slow', 'fast']) == ['slow']
+
+
+def test_call_enforces_deadline_and_open_circuit():
+    router = TTSRouter()
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(router.call('slow', slow, 0.05))
+    assert router.state()['slow']['consecutive_failures'] == 1
+    router.engines['slow'].state, router.engines['slow'].opened_at = 'open', time.monotonic()
+    with pytest.raises(EngineUnavailable):
+        asyncio.run(router.call('slow', slow, 0.05))
+
+
+class SlowResponse:
+    status_code = 200
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        for _ in range(10):
+            time.sleep(0.05)
+            yield b'G'
+
+
+def test_timed_out_elevenlabs_never_touches_the_fallback_output(tmp_path, monkeypatch):
+    monkeypatch.setenv('ELEVENLABS_API_KEY', 'test')
+    monkeypatch.setitem(sys.modules, 'requests', types.SimpleNamespace(post=lambda *a, **k: SlowResponse()))
+    monkeypatch.setitem(audio_generator.TTS_TIMEOUTS, 'elevenlabs', 0.15)
+    monkeypatch.setattr(audio_generator, 'TTS_ENGINES', ['elevenlabs', 'edge-tts'])
+    monkeypatch.setattr(audio_generator, 'tts_router', TTSRouter())
+
+    async def fake_edge(text, output_path):
+        with audio_generator.streaming_file(output_path) as f:
+            f.write(b'edge')
+        return output_path
+    monkeypatch.setattr(audio_generator, 'generate_edge_tts', fake_edge)
+
+    output = str(tmp_path / 'out.mp3')
+    assert asyncio.run(audio_generator.generate_audio(f'race {time.time()}', output, chunked=False)) == output
+    time.sleep(0.7)  # long enough for the abandoned thread to have finished its download
+    with open(output, 'rb') as f:
+        assert f.read() == b'edge'
+    assert os.listdir(tmp_path) == ['out.mp3']
+
+
+def test_failed_sentence_falls_back_to_whole_text_synthesis(tmp_path, monkeypatch):
+    monkeypatch.delenv('ELEVENLABS_API_KEY', raising=False)
+    monkeypatch.setattr(audio_generator, 'tts_router', TTSRouter())
+    calls = []
+
+    async def flaky_edge(text, output_path):
+        calls.append(text)
+        if text.startswith('Second'):
+            raise RuntimeError('edge refused this sentence')
+        with audio_generator.streaming_file(output_path) as f:
+            f.write(text.encode())
+        return output_path
+    monkeypatch.setattr(audio_generator, 'generate_edge_tts', flaky_edge)
+    monkeypatch.setattr(audio_generator, 'create_ambient_audio', lambda *a: pytest.fail('ambient fill used'))
+
+    text = 'First sentence has enough words. Second sentence has enough words.'
+    output = str(tmp_path / 'out.mp3')
+    assert asyncio.run(audio_generator.generate_audio(text, output, chunked=True)) == output
+    with open(output, 'rb') as f:
+        assert f.read() == text.encode()
+    assert calls[-1] == text
+
+
+def test_follow_audio_stops_waiting_when_the_job_ends(tmp_path):
+    started = time.monotonic()
+    assert list(audio_generator.follow_audio(str(tmp_path / 'never.mp3'), timeout=5, alive=lambda: False)) == []
+    assert time.monotonic() - started < 1
+
+
+def test_follow_audio_outwaits_its_timeout_while_the_job_is_queued(tmp_path):
+    output, checks = str(tmp_path / 'late.mp3'), []
+
+    def alive():
+        checks.append(1)
+        if len(checks) == 5:  # the job finally runs, well past the idle timeout
+            with audio_generator.streaming_file(output) as f:
+                f.write(b'audio')
+        return len(checks) < 5
+    assert b''.join(audio_generator.follow_audio(output, timeout=0.01, poll=0.01, alive=alive)) == b'audio'
+
+
+def test_failed_sentence_cancels_the_others_before_cleanup(tmp_path, monkeypatch):
+    monkeypatch.delenv('ELEVENLABS_API_KEY', raising=False)
+    monkeypatch.setattr(audio_generator, 'tts_router', TTSRouter())
+
+    async def edge(text, output_path):
+        if text.startswith('Second'):
+            raise RuntimeError('edge refused this sentence')
+        if len(text) < 40:  # a single sentence: slow, so it is still running when the failure lands
+            await asyncio.sleep(0.3)
+        with audio_generator.streaming_file(output_path) as f:
+            f.write(b'x')
+        return output_path
+    monkeypatch.setattr(audio_generator, 'generate_edge_tts', edge)
+
+    output = str(tmp_path / 'o.mp3')
+    text = 'First sentence has enough words. Second sentence has enough words. Third sentence has enough words.'
+
+    async def scenario():
+        with pytest.raises(audio_generator.AllEnginesFailed):
+            await audio_generator.generate_audio_chunked(text, output)
+        await asyncio.sleep(0.5)
+    asyncio.run(scenario())
+    assert os.listdir(tmp_path) == []
+
+
+def test_ambient_fill_runs_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.delenv('ELEVENLABS_API_KEY', raising=False)
+    monkeypatch.setattr(audio_generator, 'tts_router', TTSRouter())
+
+    async def edge(text, output_path):
+        raise RuntimeError('edge is down')
+    monkeypatch.setattr(audio_generator, 'generate_edge_tts', edge)
+    threads = []
+
+    def ambient(text, output_path):
+        threads.append(threading.current_thread())
+        return output_path
+    monkeypatch.setattr(audio_generator, 'create_ambient_audio', ambient)
+
+    output = str(tmp_path / 'o.mp3')
+    assert asyncio.run(audio_generator.generate_audio('Hello there.', output, chunked=False)) == output
+    assert threads and threads[0] is not threading.main_thread()
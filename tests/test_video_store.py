@@ -0,0 +1,9 @@
+import pytest
+
+import video_store
+
+
+def test_serverless_refuses_an_in_memory_database(monkeypatch):
+    monkeypatch.setattr(video_store, 'ON_SERVERLESS', True)
+    with pytest.raises(RuntimeError, match='OMMAE_DB_PATH'):
+        video_store.VideoStore('/tmp/ommae-serverless-test.db')